@@ -0,0 +1,28 @@
+"""Add high_water_mark to scheduler_shard_runs
+
+Revision ID: 2b6e9d4c8f17
+Revises: 7d3b8f1e6a42
+Create Date: 2026-10-17 21:02:13.518604
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '2b6e9d4c8f17'
+down_revision: Union[str, Sequence[str], None] = '7d3b8f1e6a42'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('scheduler_shard_runs', sa.Column('high_water_mark', sa.TIMESTAMP(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('scheduler_shard_runs', 'high_water_mark')
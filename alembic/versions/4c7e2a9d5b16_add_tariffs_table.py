@@ -0,0 +1,44 @@
+"""Add tariffs table
+
+Revision ID: 4c7e2a9d5b16
+Revises: e71a6c05d4f9
+Create Date: 2026-10-17 18:42:05.318650
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4c7e2a9d5b16'
+down_revision: Union[str, Sequence[str], None] = 'e71a6c05d4f9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    tariffs = op.create_table(
+        'tariffs',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('amount', sa.Integer(), nullable=False),
+        sa.Column('duration_days', sa.Integer(), nullable=False),
+        sa.Column('title', sa.String(), nullable=False),
+        sa.Column('is_active', sa.Boolean(), nullable=False, server_default=sa.true()),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('amount'),
+    )
+    # The tariffs that used to be hardcoded in the bot
+    op.bulk_insert(tariffs, [
+        {'amount': 1500, 'duration_days': 30, 'title': '1500р - 1 месяц', 'is_active': True},
+        {'amount': 2900, 'duration_days': 30, 'title': '2900р - 1 месяц', 'is_active': True},
+        {'amount': 3900, 'duration_days': 30, 'title': '3900р - 1 месяц', 'is_active': True},
+        {'amount': 4900, 'duration_days': 30, 'title': '4900р - 1 месяц', 'is_active': True},
+    ])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('tariffs')
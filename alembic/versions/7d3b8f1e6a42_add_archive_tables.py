@@ -0,0 +1,59 @@
+"""Add subscriptions and payments archive tables
+
+Revision ID: 7d3b8f1e6a42
+Revises: 4c7e2a9d5b16
+Create Date: 2026-10-17 20:11:47.902316
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7d3b8f1e6a42'
+down_revision: Union[str, Sequence[str], None] = '4c7e2a9d5b16'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'subscriptions_archive',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.BigInteger(), nullable=False),
+        sa.Column('end_date', sa.TIMESTAMP(), nullable=False),
+        sa.Column('status', postgresql.ENUM(name='subscriptionstatus', create_type=False), nullable=False),
+        sa.Column('amount_paid', sa.DECIMAL(), nullable=False),
+        sa.Column('start_date', sa.TIMESTAMP(), nullable=False),
+        sa.Column('invite_link', sa.String(), nullable=True),
+        sa.Column('last_warning_sent', sa.Date(), nullable=True),
+        sa.Column('archived_at', sa.TIMESTAMP(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_subscriptions_archive_user_id', 'subscriptions_archive', ['user_id'], unique=False)
+    op.create_table(
+        'payments_archive',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('yookassa_id', sa.String(), nullable=False),
+        sa.Column('user_id', sa.BigInteger(), nullable=False),
+        sa.Column('status', postgresql.ENUM(name='paymentstatus', create_type=False), nullable=False),
+        sa.Column('subscription_id', sa.Integer(), nullable=False),
+        sa.Column('bot_message_id', sa.BigInteger(), nullable=True),
+        sa.Column('archived_at', sa.TIMESTAMP(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_payments_archive_yookassa_id', 'payments_archive', ['yookassa_id'], unique=False)
+    op.create_index('ix_payments_archive_subscription_id', 'payments_archive', ['subscription_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_payments_archive_subscription_id', table_name='payments_archive')
+    op.drop_index('ix_payments_archive_yookassa_id', table_name='payments_archive')
+    op.drop_table('payments_archive')
+    op.drop_index('ix_subscriptions_archive_user_id', table_name='subscriptions_archive')
+    op.drop_table('subscriptions_archive')
@@ -0,0 +1,43 @@
+"""Add invite_links pool
+
+Revision ID: 9b4d2e7f1c83
+Revises: 5e0f3c9a7b21
+Create Date: 2026-10-17 15:08:32.774219
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9b4d2e7f1c83'
+down_revision: Union[str, Sequence[str], None] = '5e0f3c9a7b21'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'invite_links',
+        sa.Column('id', sa.BigInteger(), nullable=False),
+        sa.Column('invite_link', sa.String(), nullable=False),
+        sa.Column('expire_date', sa.TIMESTAMP(), nullable=False),
+        sa.Column('created_at', sa.TIMESTAMP(), nullable=False),
+        sa.Column('claimed_at', sa.TIMESTAMP(), nullable=True),
+        sa.Column('claimed_by', sa.BigInteger(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('invite_link'),
+    )
+    op.create_index(
+        'ix_invite_links_available', 'invite_links', ['expire_date'],
+        unique=False, postgresql_where=sa.text("claimed_at IS NULL"),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_invite_links_available', table_name='invite_links', postgresql_where=sa.text("claimed_at IS NULL"))
+    op.drop_table('invite_links')
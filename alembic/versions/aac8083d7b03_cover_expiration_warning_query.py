@@ -0,0 +1,43 @@
+"""Cover expiration warning query with the active subscriptions index
+
+Revision ID: aac8083d7b03
+Revises: cdd07559d262
+Create Date: 2026-10-17 12:26:51.883104
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'aac8083d7b03'
+down_revision: Union[str, Sequence[str], None] = 'cdd07559d262'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Build the covering index before dropping the one it replaces,
+    # so the scheduler never runs without an index.
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_subscriptions_active_expiry', 'subscriptions', ['end_date', 'id'],
+            unique=False, postgresql_include=['user_id', 'last_warning_sent'],
+            postgresql_where=sa.text("status = 'active'"),
+            postgresql_concurrently=True, if_not_exists=True,
+        )
+        op.drop_index('ix_subscriptions_active_end_date', table_name='subscriptions', postgresql_concurrently=True, if_exists=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_subscriptions_active_end_date', 'subscriptions', ['end_date', 'id'],
+            unique=False, postgresql_where=sa.text("status = 'active'"),
+            postgresql_concurrently=True, if_not_exists=True,
+        )
+        op.drop_index('ix_subscriptions_active_expiry', table_name='subscriptions', postgresql_concurrently=True, if_exists=True)
@@ -0,0 +1,42 @@
+"""Add scheduler coordination tables
+
+Revision ID: c558855a713d
+Revises: aac8083d7b03
+Create Date: 2026-10-17 13:40:09.117352
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c558855a713d'
+down_revision: Union[str, Sequence[str], None] = 'aac8083d7b03'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'scheduler_replicas',
+        sa.Column('replica_id', sa.String(), nullable=False),
+        sa.Column('heartbeat_at', sa.TIMESTAMP(), nullable=False),
+        sa.PrimaryKeyConstraint('replica_id'),
+    )
+    op.create_table(
+        'scheduler_shard_runs',
+        sa.Column('job_name', sa.String(), nullable=False),
+        sa.Column('shard', sa.Integer(), nullable=False),
+        sa.Column('finished_at', sa.TIMESTAMP(), nullable=False),
+        sa.Column('replica_id', sa.String(), nullable=False),
+        sa.PrimaryKeyConstraint('job_name', 'shard'),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('scheduler_shard_runs')
+    op.drop_table('scheduler_replicas')
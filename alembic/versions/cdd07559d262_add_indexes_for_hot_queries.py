@@ -0,0 +1,57 @@
+"""Add indexes for hot queries
+
+Revision ID: cdd07559d262
+Revises: fcee6db41a35
+Create Date: 2026-10-17 11:02:17.530948
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'cdd07559d262'
+down_revision: Union[str, Sequence[str], None] = 'fcee6db41a35'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction block.
+    # If a concurrent build fails it leaves an INVALID index behind: drop it and rerun.
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'uq_payments_yookassa_id', 'payments', ['yookassa_id'],
+            unique=True, postgresql_concurrently=True, if_not_exists=True,
+        )
+        op.create_index(
+            'ix_payments_subscription_id', 'payments', ['subscription_id'],
+            unique=False, postgresql_concurrently=True, if_not_exists=True,
+        )
+        op.create_index(
+            'ix_subscriptions_user_id_status_end_date', 'subscriptions', ['user_id', 'status', 'end_date'],
+            unique=False, postgresql_concurrently=True, if_not_exists=True,
+        )
+        op.create_index(
+            'ix_subscriptions_active_end_date', 'subscriptions', ['end_date', 'id'],
+            unique=False, postgresql_where=sa.text("status = 'active'"),
+            postgresql_concurrently=True, if_not_exists=True,
+        )
+        op.create_index(
+            'ix_subscriptions_invite_link', 'subscriptions', ['invite_link'],
+            unique=False, postgresql_where=sa.text("invite_link IS NOT NULL"),
+            postgresql_concurrently=True, if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_subscriptions_invite_link', table_name='subscriptions', postgresql_concurrently=True, if_exists=True)
+        op.drop_index('ix_subscriptions_active_end_date', table_name='subscriptions', postgresql_concurrently=True, if_exists=True)
+        op.drop_index('ix_subscriptions_user_id_status_end_date', table_name='subscriptions', postgresql_concurrently=True, if_exists=True)
+        op.drop_index('ix_payments_subscription_id', table_name='payments', postgresql_concurrently=True, if_exists=True)
+        op.drop_index('uq_payments_yookassa_id', table_name='payments', postgresql_concurrently=True, if_exists=True)
@@ -0,0 +1,52 @@
+"""Add outbox_messages
+
+Revision ID: e71a6c05d4f9
+Revises: 9b4d2e7f1c83
+Create Date: 2026-10-17 15:47:05.391826
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e71a6c05d4f9'
+down_revision: Union[str, Sequence[str], None] = '9b4d2e7f1c83'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'outbox_messages',
+        sa.Column('id', sa.BigInteger(), nullable=False),
+        sa.Column('user_id', sa.BigInteger(), nullable=False),
+        sa.Column('kind', sa.String(), nullable=False),
+        sa.Column('payload', postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+        sa.Column('status', sa.Enum('pending', 'done', 'dead', name='outboxstatus'), nullable=False),
+        sa.Column('attempts', sa.Integer(), nullable=False),
+        sa.Column('next_attempt_at', sa.TIMESTAMP(), nullable=False),
+        sa.Column('last_error', sa.String(), nullable=True),
+        sa.Column('created_at', sa.TIMESTAMP(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index(
+        'ix_outbox_messages_pending', 'outbox_messages', ['next_attempt_at'],
+        unique=False, postgresql_where=sa.text("status = 'pending'"),
+    )
+    op.create_index(
+        'ix_outbox_messages_pending_user', 'outbox_messages', ['user_id', 'id'],
+        unique=False, postgresql_where=sa.text("status = 'pending'"),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_outbox_messages_pending_user', table_name='outbox_messages', postgresql_where=sa.text("status = 'pending'"))
+    op.drop_index('ix_outbox_messages_pending', table_name='outbox_messages', postgresql_where=sa.text("status = 'pending'"))
+    op.drop_table('outbox_messages')
+    sa.Enum(name='outboxstatus').drop(op.get_bind(), checkfirst=True)
@@ -0,0 +1,48 @@
+"""Add webhook_events inbox table
+
+Revision ID: fcee6db41a35
+Revises: 08aa6047beab
+Create Date: 2026-10-17 10:12:41.204113
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'fcee6db41a35'
+down_revision: Union[str, Sequence[str], None] = '08aa6047beab'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'webhook_events',
+        sa.Column('id', sa.BigInteger(), nullable=False),
+        sa.Column('event', sa.String(), nullable=False),
+        sa.Column('object_id', sa.String(), nullable=False),
+        sa.Column('payload', postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+        sa.Column('status', sa.Enum('pending', 'done', 'dead', name='webhookeventstatus'), nullable=False),
+        sa.Column('attempts', sa.Integer(), nullable=False),
+        sa.Column('next_attempt_at', sa.TIMESTAMP(), nullable=False),
+        sa.Column('last_error', sa.String(), nullable=True),
+        sa.Column('created_at', sa.TIMESTAMP(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('event', 'object_id', name='uq_webhook_events_event_object_id'),
+    )
+    op.create_index(
+        'ix_webhook_events_pending', 'webhook_events', ['next_attempt_at'],
+        unique=False, postgresql_where=sa.text("status = 'pending'"),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_webhook_events_pending', table_name='webhook_events', postgresql_where=sa.text("status = 'pending'"))
+    op.drop_table('webhook_events')
+    sa.Enum(name='webhookeventstatus').drop(op.get_bind(), checkfirst=True)
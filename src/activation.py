@@ -0,0 +1,145 @@
+import logging
+from dataclasses import dataclass
+from datetime import datetime
+
+from sqlalchemy import select, update, delete, func
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from src.models import OutboxMessage, Payment, PaymentStatus, Subscription, SubscriptionStatus, User
+from src.outbox import outbox_message
+from src.subscription_cache import subscription_cache, invalidation_notice
+
+# Outbox message that grants the user access once their subscription is active
+SUBSCRIPTION_ACTIVATED = "subscription_activated"
+
+
+@dataclass(frozen=True)
+class ActivationResult:
+    payment_id: int
+    subscription_id: int
+    user_id: int
+    bot_message_id: int | None
+    # False when the payment had already been processed by an earlier delivery
+    activated: bool
+    expired_subscriptions: int = 0
+    deleted_subscriptions: int = 0
+    deleted_payments: int = 0
+
+
+async def activate_payment(async_session: async_sessionmaker, yookassa_payment_id: str) -> ActivationResult | None:
+    """
+    Marks a succeeded payment as paid and activates its subscription.
+
+    Runs in one transaction with a fixed number of statements: the payment
+    and its user are locked with SELECT ... FOR UPDATE, so concurrent
+    deliveries of the same notification (or two payments of one user) are
+    serialized, and a single statement of data-modifying CTEs then expires
+    the user's other active subscriptions, activates the paid one, deletes
+    stale pending checkouts with their payments, marks the payment succeeded
+    and queues the SUBSCRIPTION_ACTIVATED outbox message that delivers the
+    invite link. Repeated calls for the same payment change nothing.
+    Returns None if the payment is unknown.
+    """
+    async with async_session() as session:
+        payment = (await session.execute(
+            select(Payment.id, Payment.status, Payment.subscription_id, Payment.user_id, Payment.bot_message_id)
+            .join(User, User.telegram_id == Payment.user_id)
+            .where(Payment.yookassa_id == yookassa_payment_id)
+            .with_for_update(of=[Payment, User])
+        )).first()
+
+        if payment is None:
+            return None
+        if payment.status == PaymentStatus.succeeded:
+            await session.rollback()
+            return ActivationResult(payment.id, payment.subscription_id, payment.user_id, payment.bot_message_id, activated=False)
+
+        now = datetime.now()
+        stale_subscriptions = (
+            select(Subscription.id)
+            .where(
+                Subscription.user_id == payment.user_id,
+                Subscription.status == SubscriptionStatus.pending,
+                Subscription.id != payment.subscription_id,
+            )
+            .cte("stale_subscriptions")
+        )
+        expired = (
+            update(Subscription)
+            .where(
+                Subscription.user_id == payment.user_id,
+                Subscription.status == SubscriptionStatus.active,
+                Subscription.id != payment.subscription_id,
+            )
+            .values(status=SubscriptionStatus.expired)
+            .returning(Subscription.id)
+            .cte("expired")
+        )
+        # The checkout stored the tariff's period as end_date - start_date;
+        # it starts counting from the moment of payment
+        activated = (
+            update(Subscription)
+            .where(Subscription.id == payment.subscription_id)
+            .values(status=SubscriptionStatus.active, start_date=now, end_date=now + (Subscription.end_date - Subscription.start_date))
+            .returning(Subscription.id)
+            .cte("activated")
+        )
+        # Foreign keys are checked at the end of the statement, so payments
+        # and their subscriptions can be deleted side by side
+        deleted_payments = (
+            delete(Payment)
+            .where(Payment.subscription_id.in_(select(stale_subscriptions.c.id)))
+            .returning(Payment.id)
+            .cte("deleted_payments")
+        )
+        deleted_subscriptions = (
+            delete(Subscription)
+            .where(Subscription.id.in_(select(stale_subscriptions.c.id)))
+            .returning(Subscription.id)
+            .cte("deleted_subscriptions")
+        )
+        paid = (
+            update(Payment)
+            .where(Payment.id == payment.id)
+            .values(status=PaymentStatus.succeeded)
+            .returning(Payment.id)
+            .cte("paid")
+        )
+        queued = (
+            outbox_message(
+                payment.user_id,
+                SUBSCRIPTION_ACTIVATED,
+                {"subscription_id": payment.subscription_id, "bot_message_id": payment.bot_message_id},
+            )
+            .returning(OutboxMessage.id)
+            .cte("queued")
+        )
+        counts = (await session.execute(
+            select(
+                select(func.count()).select_from(expired).scalar_subquery().label("expired"),
+                select(func.count()).select_from(activated).scalar_subquery().label("activated"),
+                select(func.count()).select_from(deleted_payments).scalar_subquery().label("deleted_payments"),
+                select(func.count()).select_from(deleted_subscriptions).scalar_subquery().label("deleted_subscriptions"),
+                select(func.count()).select_from(paid).scalar_subquery().label("paid"),
+                select(func.count()).select_from(queued).scalar_subquery().label("queued"),
+            )
+        )).one()
+        await session.execute(invalidation_notice([payment.user_id]))
+        await session.commit()
+
+    subscription_cache.invalidate(payment.user_id)
+    logging.info(
+        f"Activated subscription {payment.subscription_id} for user {payment.user_id} (payment {payment.id}): "
+        f"expired {counts.expired} active, removed {counts.deleted_subscriptions} pending subscriptions "
+        f"and {counts.deleted_payments} payments"
+    )
+    return ActivationResult(
+        payment.id,
+        payment.subscription_id,
+        payment.user_id,
+        payment.bot_message_id,
+        activated=True,
+        expired_subscriptions=counts.expired,
+        deleted_subscriptions=counts.deleted_subscriptions,
+        deleted_payments=counts.deleted_payments,
+    )
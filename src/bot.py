@@ -1,36 +1,156 @@
 import asyncio
 import logging
+import signal
 import sys
 from aiohttp import web
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from datetime import timedelta
 from functools import partial
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker
 
 from aiogram import Bot, Dispatcher, F
 from aiogram.client.default import DefaultBotProperties
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
 from aiogram.enums import ParseMode
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler
 
-from src.config import BOT_TOKEN, GROUP_ID
+from src.config import (
+    BOT_TOKEN, GROUP_ID, YOOKASSA_SHOP_ID, YOOKASSA_SECRET_KEY, TELEGRAM_API_URL,
+    TELEGRAM_DELIVERY_MODE, TELEGRAM_WEBHOOK_URL, TELEGRAM_WEBHOOK_PATH, TELEGRAM_WEBHOOK_SECRET,
+    SCHEDULER_TICK_INTERVAL, RECONCILIATION_INTERVAL_MINUTES, RETENTION_INTERVAL_HOURS,
+    WEB_HOST, WEB_PORT,
+)
 from src.handlers.user_handlers import user_router
 from src.handlers.payment_handlers import payment_router
 from src.handlers.group_handlers import group_router
-from src.database import async_session, engine
-from src.webhooks import setup_webhook_routes
+from src.database import build_engine, warm_pool
+from src.webhooks import setup_webhook_routes, process_yookassa_event, send_subscription_access
+from src.webhook_inbox import WebhookInbox
 from src.scheduler import check_expired_subscriptions, send_expiration_warnings
+from src.coordination import JobCoordinator
+from src.reconciliation import reconcile_payments, RECONCILIATION_JOB
+from src.retention import run_retention
+from src.fsm_storage import PostgresStorage
+from src.invite_links import InviteLinkPool
+from src.outbox import OutboxDispatcher
+from src.activation import SUBSCRIPTION_ACTIVATED
+from src.yookassa_client import YooKassaClient
+from src.outbound import OutboundDispatcher
+from src.bot_metadata import bot_metadata
+from src.lexicon import LexiconMiddleware, lexicon
+from src.tariffs import tariff_catalog
+from src.subscription_cache import subscription_cache
+from src.metrics import UpdateMetricsMiddleware, TelegramMetricsMiddleware, instrument_router
+from src.health import Readiness
+from src.drain import Drain, DrainMiddleware
 
-async def on_startup(bot: Bot, scheduler: AsyncIOScheduler):
-    scheduler.add_job(check_expired_subscriptions, 'interval', hours=1, args=(bot, async_session))
-    scheduler.add_job(send_expiration_warnings, 'interval', days=1, args=(bot, async_session))
-    scheduler.start()
+async def on_startup(bot: Bot, engine: AsyncEngine, async_session: async_sessionmaker, readiness: Readiness, scheduler: AsyncIOScheduler, coordinator: JobCoordinator, yookassa: YooKassaClient, webhook_inbox: WebhookInbox, outbound: OutboundDispatcher, invite_links: InviteLinkPool, outbox: OutboxDispatcher):
+    # Independent of each other, so a cold start costs the slowest of them rather than their sum
+    with readiness.phase("warm_up"):
+        await asyncio.gather(
+            readiness.timed("db_pool", warm_pool(engine)),
+            readiness.timed("bot_metadata", bot_metadata.warm(bot)),
+            readiness.timed("tariff_catalog", tariff_catalog.warm(async_session)),
+            readiness.timed("lexicon", asyncio.to_thread(lexicon.warm)),
+        )
+    with readiness.phase("background_services"):
+        bot_metadata.start(bot)
+        tariff_catalog.start(async_session)
+        subscription_cache.start(engine)
+        outbound.start()
+        invite_links.start()
+        outbox.start()
+        webhook_inbox.start()
+        await coordinator.start()
+    with readiness.phase("scheduler"):
+        # Every replica ticks often; the coordinator decides which shards are due and whose they are
+        scheduler.add_job(
+            coordinator.run_due_shards, 'interval', seconds=SCHEDULER_TICK_INTERVAL,
+            args=("expiration_sweep", timedelta(hours=1), partial(check_expired_subscriptions, outbound, async_session)),
+        )
+        scheduler.add_job(
+            coordinator.run_due_shards, 'interval', seconds=SCHEDULER_TICK_INTERVAL,
+            args=("expiration_warnings", timedelta(days=1), partial(send_expiration_warnings, outbound, async_session)),
+        )
+        # Catches payments whose webhook never arrived; one replica pages through the YooKassa list for everyone
+        scheduler.add_job(
+            coordinator.run_due_job, 'interval', seconds=SCHEDULER_TICK_INTERVAL,
+            args=(RECONCILIATION_JOB, timedelta(minutes=RECONCILIATION_INTERVAL_MINUTES), partial(reconcile_payments, async_session, yookassa, outbox)),
+        )
+        scheduler.add_job(
+            coordinator.run_due_job, 'interval', seconds=SCHEDULER_TICK_INTERVAL,
+            args=("retention", timedelta(hours=RETENTION_INTERVAL_HOURS), partial(run_retention, async_session)),
+        )
+        scheduler.start()
     logging.info("Bot and scheduler started.")
 
-async def on_shutdown(app_runner: web.AppRunner, scheduler: AsyncIOScheduler):
-    scheduler.shutdown()
+async def set_telegram_webhook(bot: Bot, dispatcher: Dispatcher, readiness: Readiness):
+    with readiness.phase("telegram_webhook"):
+        await bot.set_webhook(
+            url=TELEGRAM_WEBHOOK_URL.rstrip("/") + TELEGRAM_WEBHOOK_PATH,
+            secret_token=TELEGRAM_WEBHOOK_SECRET,
+            allowed_updates=dispatcher.resolve_used_update_types(),
+        )
+    logging.info(f"Telegram webhook set to {TELEGRAM_WEBHOOK_URL.rstrip('/')}{TELEGRAM_WEBHOOK_PATH}")
+
+async def mark_ready(readiness: Readiness):
+    readiness.mark_ready()
+
+async def run_webhook(dp: Dispatcher, bot: Bot):
+    """
+    Keeps the process alive while Telegram pushes updates to the aiohttp app.
+    Mirrors what start_polling does around the polling loop.
+    """
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop_event.set)
+
+    workflow_data = {"dispatcher": dp, **dp.workflow_data}
+    await dp.emit_startup(bot=bot, **workflow_data)
+    try:
+        await stop_event.wait()
+    finally:
+        await dp.emit_shutdown(bot=bot, **workflow_data)
+        await bot.session.close()
+
+async def on_shutdown(engine: AsyncEngine, readiness: Readiness, drain: Drain, app_runner: web.AppRunner, scheduler: AsyncIOScheduler, coordinator: JobCoordinator, yookassa: YooKassaClient, webhook_inbox: WebhookInbox, outbound: OutboundDispatcher, invite_links: InviteLinkPool, outbox: OutboxDispatcher):
+    # Take no new work: /readyz fails, webhooks get 503 + Retry-After, no new scheduler runs
+    readiness.mark_draining()
+    drain.start()
+    scheduler.pause()
+
+    # Let webhook requests, Telegram updates and scheduler shards in flight finish
+    await asyncio.gather(drain.wait_idle(), coordinator.drain(drain.remaining()))
+    scheduler.shutdown(wait=False)
+    await coordinator.stop()
+
+    # Finish the events and messages being processed, then send the Bot API calls they queued
+    await asyncio.gather(webhook_inbox.stop(drain.remaining()), outbox.stop(drain.remaining()))
+    await invite_links.stop()
+    await outbound.stop(drain.remaining())
     await app_runner.cleanup()
+
+    await bot_metadata.stop()
+    await tariff_catalog.stop()
+    await subscription_cache.stop()
+    await yookassa.close()
+    # Last, once nothing uses the database anymore
     await engine.dispose()
     logging.info("Bot, scheduler, and web server stopped.")
 
 async def main() -> None:
     logging.basicConfig(level=logging.INFO, stream=sys.stdout)
+    readiness = Readiness()
+    drain = Drain()
+
+    if TELEGRAM_DELIVERY_MODE not in ("polling", "webhook"):
+        logging.error("TELEGRAM_DELIVERY_MODE must be either 'polling' or 'webhook'.")
+        sys.exit(1)
+    if TELEGRAM_DELIVERY_MODE == "webhook" and not (TELEGRAM_WEBHOOK_URL and TELEGRAM_WEBHOOK_SECRET):
+        logging.error("TELEGRAM_WEBHOOK_URL and TELEGRAM_WEBHOOK_SECRET must be set in webhook mode.")
+        sys.exit(1)
 
     if not GROUP_ID:
         logging.error("GROUP_ID is not set in environment variables. Please set it to a valid integer.")
@@ -41,10 +161,23 @@ async def main() -> None:
         logging.error("GROUP_ID is not a valid integer. Please set it to a valid integer.")
         sys.exit(1)
 
-    bot = Bot(token=BOT_TOKEN, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
-    dp = Dispatcher(async_session=async_session)
+    # Opens no connection yet; the warm-up does
+    engine = build_engine()
+    async_session = async_sessionmaker(engine, expire_on_commit=False)
+
+    session = AiohttpSession(api=TelegramAPIServer.from_base(TELEGRAM_API_URL)) if TELEGRAM_API_URL else None
+    bot = Bot(token=BOT_TOKEN, session=session, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
+    bot.session.middleware(TelegramMetricsMiddleware())
+    yookassa = YooKassaClient(YOOKASSA_SHOP_ID, YOOKASSA_SECRET_KEY)
+    outbound = OutboundDispatcher(bot)
+    invite_links = InviteLinkPool(bot, outbound, engine, async_session)
+    outbox = OutboxDispatcher(async_session, {
+        SUBSCRIPTION_ACTIVATED: partial(send_subscription_access, bot=bot, async_session=async_session, invite_links=invite_links),
+    })
+    dp = Dispatcher(storage=PostgresStorage(async_session), async_session=async_session, yookassa=yookassa, outbound=outbound, outbox=outbox)
     
     scheduler = AsyncIOScheduler()
+    coordinator = JobCoordinator(engine, async_session)
 
     # Filter routers to only handle private messages
     user_router.message.filter(F.chat.type == "private")
@@ -55,26 +188,62 @@ async def main() -> None:
     dp.include_router(user_router)
     dp.include_router(group_router)
 
+    dp.update.outer_middleware(UpdateMetricsMiddleware())
+    dp.update.outer_middleware(DrainMiddleware(drain))
+    dp.update.outer_middleware(LexiconMiddleware())
+    for router in (payment_router, user_router, group_router):
+        instrument_router(router)
+
     # Create aiohttp web application
-    app = web.Application()
+    app = web.Application(middlewares=[drain.middleware])
     app["bot"] = bot
     app["async_session"] = async_session
+    app["yookassa"] = yookassa
+    app["outbound"] = outbound
+    app["readiness"] = readiness
+    webhook_inbox = WebhookInbox(
+        async_session,
+        partial(process_yookassa_event, async_session=async_session, yookassa=yookassa, outbox=outbox),
+    )
+    app["webhook_inbox"] = webhook_inbox
     setup_webhook_routes(app)
 
-    # Create AppRunner
-    runner = web.AppRunner(app)
-    await runner.setup()
-    site = web.TCPSite(runner, 'localhost', 8080) 
-    await site.start()
+    if TELEGRAM_DELIVERY_MODE == "webhook":
+        # Updates are handled in background tasks so Telegram gets its 200 right away
+        SimpleRequestHandler(
+            dispatcher=dp,
+            bot=bot,
+            handle_in_background=True,
+            secret_token=TELEGRAM_WEBHOOK_SECRET,
+        ).register(app, path=TELEGRAM_WEBHOOK_PATH)
+
+    # Up before the warm-up, so /healthz and /readyz can be probed while it runs
+    with readiness.phase("web_server"):
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, WEB_HOST, WEB_PORT)
+        await site.start()
 
-    dp.startup.register(partial(on_startup, scheduler=scheduler))
-    dp.shutdown.register(partial(on_shutdown, app_runner=runner, scheduler=scheduler))
+    dp.startup.register(partial(on_startup, engine=engine, async_session=async_session, readiness=readiness, scheduler=scheduler, coordinator=coordinator, yookassa=yookassa, webhook_inbox=webhook_inbox, outbound=outbound, invite_links=invite_links, outbox=outbox))
+    dp.shutdown.register(partial(on_shutdown, engine=engine, readiness=readiness, drain=drain, app_runner=runner, scheduler=scheduler, coordinator=coordinator, yookassa=yookassa, webhook_inbox=webhook_inbox, outbound=outbound, invite_links=invite_links, outbox=outbox))
+    if TELEGRAM_DELIVERY_MODE == "webhook":
+        # Registered last so Telegram only starts pushing once everything else is up
+        dp.startup.register(partial(set_telegram_webhook, readiness=readiness))
+    # Last of all: /readyz turns green only once every startup handler has finished
+    dp.startup.register(partial(mark_ready, readiness=readiness))
 
     try:
-        await dp.start_polling(bot)
+        if TELEGRAM_DELIVERY_MODE == "webhook":
+            await run_webhook(dp, bot)
+        else:
+            # getUpdates is refused while a webhook is set
+            await bot.delete_webhook()
+            await dp.start_polling(bot)
     finally:
+        # on_shutdown has done this already, unless startup failed before it was reached
         await runner.cleanup()
-        scheduler.shutdown()
+        if scheduler.running:
+            scheduler.shutdown(wait=False)
 
 if __name__ == "__main__":
     asyncio.run(main())
@@ -0,0 +1,80 @@
+import asyncio
+import logging
+
+from aiogram import Bot
+
+from src.config import GROUP_ID, BOT_METADATA_TTL
+
+
+class BotMetadataCache:
+    """
+    Caches the bot username and the group title, which are needed on every
+    payment but almost never change.
+
+    Values are warmed at startup and refreshed in the background every TTL.
+    Group updates (title changes, the bot's own membership changes) update
+    or invalidate the title early; a missing value is fetched on demand.
+    """
+
+    def __init__(self, ttl: float = BOT_METADATA_TTL):
+        self.ttl = ttl
+        self._bot_username: str | None = None
+        self._group_title: str | None = None
+        self._lock = asyncio.Lock()
+        self._refresh_task: asyncio.Task | None = None
+
+    async def warm(self, bot: Bot) -> None:
+        results = await asyncio.gather(
+            self._fetch_bot_username(bot),
+            self._fetch_group_title(bot),
+            return_exceptions=True,
+        )
+        for result in results:
+            if isinstance(result, Exception):
+                # Keep serving the previous values; missing ones are fetched on demand
+                logging.warning(f"Could not refresh bot metadata: {result}")
+
+    def start(self, bot: Bot) -> None:
+        self._refresh_task = asyncio.create_task(self._refresh_loop(bot), name="bot-metadata-refresh")
+
+    async def stop(self) -> None:
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+            await asyncio.gather(self._refresh_task, return_exceptions=True)
+            self._refresh_task = None
+
+    async def get_bot_username(self, bot: Bot) -> str:
+        if self._bot_username is None:
+            async with self._lock:
+                if self._bot_username is None:
+                    await self._fetch_bot_username(bot)
+        return self._bot_username
+
+    async def get_group_title(self, bot: Bot) -> str:
+        if self._group_title is None:
+            async with self._lock:
+                if self._group_title is None:
+                    await self._fetch_group_title(bot)
+        return self._group_title
+
+    def set_group_title(self, title: str) -> None:
+        self._group_title = title
+
+    def invalidate_group(self) -> None:
+        self._group_title = None
+
+    async def _fetch_bot_username(self, bot: Bot) -> None:
+        bot_user = await bot.get_me()
+        self._bot_username = bot_user.username
+
+    async def _fetch_group_title(self, bot: Bot) -> None:
+        group_chat = await bot.get_chat(int(GROUP_ID))
+        self._group_title = group_chat.title
+
+    async def _refresh_loop(self, bot: Bot) -> None:
+        while True:
+            await asyncio.sleep(self.ttl)
+            await self.warm(bot)
+
+
+bot_metadata = BotMetadataCache()
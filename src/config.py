@@ -4,18 +4,121 @@ import os
 load_dotenv()
 
 BOT_TOKEN = os.getenv("BOT_TOKEN")
+# Optional Bot API server base URL (a local Bot API server or tools/fake_telegram.py)
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL")
+
+# "polling" or "webhook"
+TELEGRAM_DELIVERY_MODE = os.getenv("TELEGRAM_DELIVERY_MODE", "polling")
+# Public base URL Telegram pushes updates to, e.g. https://bot.example.com
+TELEGRAM_WEBHOOK_URL = os.getenv("TELEGRAM_WEBHOOK_URL")
+TELEGRAM_WEBHOOK_PATH = os.getenv("TELEGRAM_WEBHOOK_PATH", "/telegram_webhook")
+TELEGRAM_WEBHOOK_SECRET = os.getenv("TELEGRAM_WEBHOOK_SECRET")
+
+# Address of the aiohttp server (YooKassa and Telegram webhooks, /metrics, /healthz, /readyz).
+# 0.0.0.0 so it is reachable from outside the container.
+WEB_HOST = os.getenv("WEB_HOST", "0.0.0.0")
+WEB_PORT = int(os.getenv("WEB_PORT", 8080))
+# When set, /metrics requires "Authorization: Bearer <token>". Set it whenever the port is reachable from outside.
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+# On shutdown, how long to wait for in-flight webhooks, updates, scheduler jobs and queued
+# Bot API calls. Keep it below the orchestrator's stop timeout (stop_grace_period in docker-compose.yml).
+SHUTDOWN_DRAIN_TIMEOUT = float(os.getenv("SHUTDOWN_DRAIN_TIMEOUT", 20))
+# Retry-After sent with the 503 that refuses webhooks while draining
+SHUTDOWN_RETRY_AFTER = int(os.getenv("SHUTDOWN_RETRY_AFTER", 5))
 
 DB_USER = os.getenv("DB_USER")
 DB_PASS = os.getenv("DB_PASS")
 DB_HOST = os.getenv("DB_HOST")
 DB_PORT = os.getenv("DB_PORT")
 DB_NAME = os.getenv("DB_NAME")
+
+# "development" turns on SQL echo by default; anything else is treated as production
+ENVIRONMENT = os.getenv("ENVIRONMENT", "production")
+DB_ECHO = os.getenv("DB_ECHO", "true" if ENVIRONMENT == "development" else "false").lower() == "true"
+# Statements slower than this many seconds are logged as warnings, 0 disables
+DB_SLOW_QUERY_THRESHOLD = float(os.getenv("DB_SLOW_QUERY_THRESHOLD", 0.5))
+# Size the pool for the concurrent DB users: inbox and outbound workers, FSM writes, handlers
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 10))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 10))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 30))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 1800))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+# Connections opened at startup, before the instance reports ready
+DB_POOL_WARM_SIZE = int(os.getenv("DB_POOL_WARM_SIZE", DB_POOL_SIZE))
+# asyncpg statement cache and SQLAlchemy's prepared statement cache, per connection.
+# Set both to 0 behind PgBouncer in transaction pooling mode.
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", 100))
+DB_PREPARED_STATEMENT_CACHE_SIZE = int(os.getenv("DB_PREPARED_STATEMENT_CACHE_SIZE", 100))
 GROUP_ID = os.getenv("GROUP_ID")
 
 YOOKASSA_SHOP_ID = os.getenv("YOOKASSA_SHOP_ID")
 YOOKASSA_SECRET_KEY = os.getenv("YOOKASSA_SECRET_KEY")
+YOOKASSA_API_URL = os.getenv("YOOKASSA_API_URL", "https://api.yookassa.ru/v3")
+YOOKASSA_TIMEOUT = float(os.getenv("YOOKASSA_TIMEOUT", 10))
+YOOKASSA_CONNECT_TIMEOUT = float(os.getenv("YOOKASSA_CONNECT_TIMEOUT", 3))
+YOOKASSA_MAX_RETRIES = int(os.getenv("YOOKASSA_MAX_RETRIES", 3))
+YOOKASSA_POOL_SIZE = int(os.getenv("YOOKASSA_POOL_SIZE", 20))
+
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", 4))
+WEBHOOK_MAX_ATTEMPTS = int(os.getenv("WEBHOOK_MAX_ATTEMPTS", 10))
+WEBHOOK_POLL_INTERVAL = float(os.getenv("WEBHOOK_POLL_INTERVAL", 5))
+
+OUTBOX_WORKERS = int(os.getenv("OUTBOX_WORKERS", 8))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", 10))
+OUTBOX_POLL_INTERVAL = float(os.getenv("OUTBOX_POLL_INTERVAL", 5))
+
+EXPIRATION_SWEEP_BATCH_SIZE = int(os.getenv("EXPIRATION_SWEEP_BATCH_SIZE", 500))
+
+# Abandoned checkouts (pending subscriptions and payments) are deleted after this
+RETENTION_PENDING_TTL_HOURS = float(os.getenv("RETENTION_PENDING_TTL_HOURS", 168))
+# Subscriptions expired this long ago move to subscriptions_archive with their payments
+RETENTION_ARCHIVE_AFTER_DAYS = float(os.getenv("RETENTION_ARCHIVE_AFTER_DAYS", 180))
+# Processed webhook events and outbox messages are kept this long
+RETENTION_QUEUE_TTL_DAYS = float(os.getenv("RETENTION_QUEUE_TTL_DAYS", 14))
+RETENTION_BATCH_SIZE = int(os.getenv("RETENTION_BATCH_SIZE", 1000))
+RETENTION_INTERVAL_HOURS = float(os.getenv("RETENTION_INTERVAL_HOURS", 24))
+
+# Pending payments are matched against the YooKassa payments list this often
+RECONCILIATION_INTERVAL_MINUTES = float(os.getenv("RECONCILIATION_INTERVAL_MINUTES", 10))
+# Pending payments older than this are no longer looked for
+RECONCILIATION_MAX_AGE_HOURS = float(os.getenv("RECONCILIATION_MAX_AGE_HOURS", 72))
+RECONCILIATION_PAGE_SIZE = int(os.getenv("RECONCILIATION_PAGE_SIZE", 100))
+
+OUTBOUND_RATE_LIMIT = float(os.getenv("OUTBOUND_RATE_LIMIT", 30))
+OUTBOUND_PER_CHAT_INTERVAL = float(os.getenv("OUTBOUND_PER_CHAT_INTERVAL", 1))
+OUTBOUND_WORKERS = int(os.getenv("OUTBOUND_WORKERS", 16))
+OUTBOUND_MAX_RETRIES = int(os.getenv("OUTBOUND_MAX_RETRIES", 3))
+OUTBOUND_QUEUE_SIZE = int(os.getenv("OUTBOUND_QUEUE_SIZE", 10000))
+
+SCHEDULER_SHARD_COUNT = int(os.getenv("SCHEDULER_SHARD_COUNT", 16))
+SCHEDULER_TICK_INTERVAL = float(os.getenv("SCHEDULER_TICK_INTERVAL", 60))
+SCHEDULER_HEARTBEAT_INTERVAL = float(os.getenv("SCHEDULER_HEARTBEAT_INTERVAL", 15))
+SCHEDULER_REPLICA_TTL = float(os.getenv("SCHEDULER_REPLICA_TTL", 45))
+
+INVITE_LINK_POOL_SIZE = int(os.getenv("INVITE_LINK_POOL_SIZE", 50))
+INVITE_LINK_LIFETIME_HOURS = float(os.getenv("INVITE_LINK_LIFETIME_HOURS", 72))
+# Pooled links with less validity left than this are no longer handed out
+INVITE_LINK_MIN_REMAINING_HOURS = float(os.getenv("INVITE_LINK_MIN_REMAINING_HOURS", 48))
+INVITE_LINK_REFILL_INTERVAL = float(os.getenv("INVITE_LINK_REFILL_INTERVAL", 60))
+INVITE_LINK_REFILL_BATCH = int(os.getenv("INVITE_LINK_REFILL_BATCH", 20))
+
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", 100000))
+SUBSCRIPTION_CACHE_TTL = float(os.getenv("SUBSCRIPTION_CACHE_TTL", 300))
+SUBSCRIPTION_CACHE_SIZE = int(os.getenv("SUBSCRIPTION_CACHE_SIZE", 50000))
+PAYMENT_STATUS_CACHE_TTL = float(os.getenv("PAYMENT_STATUS_CACHE_TTL", 5))
+PAYMENT_STATUS_CACHE_SIZE = int(os.getenv("PAYMENT_STATUS_CACHE_SIZE", 10000))
+BOT_METADATA_TTL = float(os.getenv("BOT_METADATA_TTL", 3600))
+# How often the tariffs table is checked for price changes
+TARIFF_REFRESH_INTERVAL = float(os.getenv("TARIFF_REFRESH_INTERVAL", 60))
+# Locale for users whose language has no file in src/locales, and for scheduled messages
+DEFAULT_LOCALE = os.getenv("DEFAULT_LOCALE", "ru")
+
+# How stale a replica's cached FSM state may be when another replica changed it
+FSM_CACHE_TTL = float(os.getenv("FSM_CACHE_TTL", 2))
+FSM_CACHE_SIZE = int(os.getenv("FSM_CACHE_SIZE", 10000))
 
 MIN_AMOUNT = int(os.getenv("MIN_AMOUNT", 1500))
 
-DATABASE_URL = f"postgresql+asyncpg://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+# A full DATABASE_URL takes precedence over the DB_* parts (used by tools/loadtest.py)
+DATABASE_URL = os.getenv("DATABASE_URL") or f"postgresql+asyncpg://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
 
@@ -0,0 +1,206 @@
+import asyncio
+import logging
+import socket
+import uuid
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Awaitable, Callable
+
+from sqlalchemy import select, delete, func, literal
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker
+
+from src.config import SCHEDULER_SHARD_COUNT, SCHEDULER_HEARTBEAT_INTERVAL, SCHEDULER_REPLICA_TTL
+from src.models import SchedulerReplica, SchedulerShardRun
+
+
+@dataclass(frozen=True)
+class Shard:
+    """
+    A slice of the subscriptions table, selected by user_id modulo the shard count.
+    """
+    index: int
+    count: int
+
+    def where(self, user_id_column):
+        return func.mod(user_id_column, self.count) == self.index
+
+
+class JobCoordinator:
+    """
+    Splits scheduler jobs between replicas.
+
+    Every replica heartbeats into scheduler_replicas. Each job is divided into
+    a fixed number of shards, and shard N belongs to the N-th live replica
+    (modulo the number of live replicas). A replica runs a shard only while
+    holding a Postgres advisory lock for it, so two replicas with a different
+    view of who is alive still never process the same shard at once. When a
+    replica stops heartbeating its shards move to the survivors, and the
+    per-shard completion time in scheduler_shard_runs makes them run as soon
+    as they are overdue.
+    """
+
+    def __init__(
+        self,
+        engine: AsyncEngine,
+        async_session: async_sessionmaker,
+        replica_id: str | None = None,
+        shard_count: int = SCHEDULER_SHARD_COUNT,
+        heartbeat_interval: float = SCHEDULER_HEARTBEAT_INTERVAL,
+        replica_ttl: float = SCHEDULER_REPLICA_TTL,
+    ):
+        self.engine = engine
+        self.async_session = async_session
+        self.replica_id = replica_id or f"{socket.gethostname()}-{uuid.uuid4().hex[:8]}"
+        self.shard_count = shard_count
+        self.heartbeat_interval = heartbeat_interval
+        self.replica_ttl = timedelta(seconds=replica_ttl)
+        self._heartbeat_task: asyncio.Task | None = None
+        self._draining = False
+        self._running: set[asyncio.Task] = set()
+
+    async def start(self) -> None:
+        await self._heartbeat()
+        self._heartbeat_task = asyncio.create_task(self._heartbeat_loop(), name="scheduler-heartbeat")
+        logging.info(f"Scheduler coordinator started as replica {self.replica_id}.")
+
+    async def stop(self) -> None:
+        if self._heartbeat_task is not None:
+            self._heartbeat_task.cancel()
+            await asyncio.gather(self._heartbeat_task, return_exceptions=True)
+            self._heartbeat_task = None
+        # Leave right away so the other replicas take over our shards on their next tick
+        async with self.async_session() as session:
+            await session.execute(delete(SchedulerReplica).where(SchedulerReplica.replica_id == self.replica_id))
+            await session.commit()
+
+    async def _heartbeat(self) -> None:
+        async with self.async_session() as session:
+            await session.execute(
+                insert(SchedulerReplica)
+                .values(replica_id=self.replica_id, heartbeat_at=func.now())
+                .on_conflict_do_update(index_elements=[SchedulerReplica.replica_id], set_={"heartbeat_at": func.now()})
+            )
+            # Forget replicas that have been gone for a long time
+            await session.execute(
+                delete(SchedulerReplica).where(SchedulerReplica.heartbeat_at < func.now() - self.replica_ttl * 10)
+            )
+            await session.commit()
+
+    async def _heartbeat_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            try:
+                await self._heartbeat()
+            except Exception as e:
+                logging.error(f"Scheduler heartbeat failed for replica {self.replica_id}: {e}")
+
+    async def owned_shards(self) -> list[int]:
+        async with self.async_session() as session:
+            live_replicas = (await session.execute(
+                select(SchedulerReplica.replica_id)
+                .where(SchedulerReplica.heartbeat_at > func.now() - self.replica_ttl)
+                .order_by(SchedulerReplica.replica_id)
+            )).scalars().all()
+        if self.replica_id not in live_replicas:
+            # Our heartbeat is late; don't guess, the lock keeps others safe meanwhile
+            return []
+        position = live_replicas.index(self.replica_id)
+        return [shard for shard in range(self.shard_count) if shard % len(live_replicas) == position]
+
+    async def run_due_shards(self, job_name: str, interval: timedelta, job: Callable[..., Awaitable]) -> None:
+        """
+        Runs `job(shard=...)` for every shard this replica owns that has not
+        completed within `interval`.
+        """
+        with self._tracked():
+            for index in await self.owned_shards():
+                # Shards not started yet stay overdue and go to the other replicas
+                if self._draining:
+                    return
+                try:
+                    await self._run_shard(job_name, interval, job, Shard(index, self.shard_count))
+                except Exception as e:
+                    logging.error(f"Scheduler job {job_name} failed on shard {index}: {e}")
+
+    async def run_due_job(self, job_name: str, interval: timedelta, job: Callable[[], Awaitable]) -> None:
+        """
+        Runs an unsharded `job()` on the replica that owns shard 0, unless it
+        completed within `interval`.
+        """
+        with self._tracked():
+            if self._draining or 0 not in await self.owned_shards():
+                return
+            try:
+                await self._run_shard(job_name, interval, lambda shard: job(), Shard(0, 1))
+            except Exception as e:
+                logging.error(f"Scheduler job {job_name} failed: {e}")
+
+    async def drain(self, timeout: float) -> None:
+        """
+        Starts no more shards and waits up to `timeout` seconds for the running
+        ones to finish, so shutdown does not cut a sweep off mid-batch. Jobs
+        still running at the deadline are cancelled and awaited, so none
+        outlives the outbound queue or the engine; their shards stay overdue
+        and the next owner reruns them.
+        """
+        self._draining = True
+        if self._running:
+            _, pending = await asyncio.wait(set(self._running), timeout=timeout)
+            if pending:
+                logging.warning(f"Cancelling {len(pending)} scheduler jobs still running at the drain deadline.")
+                for task in pending:
+                    task.cancel()
+                await asyncio.gather(*pending, return_exceptions=True)
+
+    @contextmanager
+    def _tracked(self):
+        task = asyncio.current_task()
+        self._running.add(task)
+        try:
+            yield
+        finally:
+            self._running.discard(task)
+
+    async def _run_shard(self, job_name: str, interval: timedelta, job: Callable[..., Awaitable], shard: Shard) -> None:
+        lock_key = (func.hashtext(literal(job_name)), literal(shard.index))
+        # Session-level advisory locks live as long as this connection,
+        # so a replica that dies mid-run releases its shard automatically.
+        async with self.engine.connect() as lock_connection:
+            locked = (await lock_connection.execute(select(func.pg_try_advisory_lock(*lock_key)))).scalar()
+            await lock_connection.commit()
+            if not locked:
+                return
+            try:
+                if not await self._is_due(job_name, shard.index, interval):
+                    return
+                logging.info(f"Running scheduler job {job_name} on shard {shard.index}/{shard.count}")
+                await job(shard=shard)
+                await self._record_run(job_name, shard.index)
+            finally:
+                await lock_connection.execute(select(func.pg_advisory_unlock(*lock_key)))
+                await lock_connection.commit()
+
+    async def _is_due(self, job_name: str, shard: int, interval: timedelta) -> bool:
+        async with self.async_session() as session:
+            recent_run = (await session.execute(
+                select(SchedulerShardRun.finished_at).where(
+                    SchedulerShardRun.job_name == job_name,
+                    SchedulerShardRun.shard == shard,
+                    SchedulerShardRun.finished_at > func.now() - interval,
+                )
+            )).first()
+        return recent_run is None
+
+    async def _record_run(self, job_name: str, shard: int) -> None:
+        async with self.async_session() as session:
+            await session.execute(
+                insert(SchedulerShardRun)
+                .values(job_name=job_name, shard=shard, finished_at=func.now(), replica_id=self.replica_id)
+                .on_conflict_do_update(
+                    index_elements=[SchedulerShardRun.job_name, SchedulerShardRun.shard],
+                    set_={"finished_at": func.now(), "replica_id": self.replica_id},
+                )
+            )
+            await session.commit()
@@ -1,9 +1,76 @@
-from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+import asyncio
+from contextlib import AsyncExitStack
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine, create_async_engine
 from sqlalchemy.orm import DeclarativeBase
-from src.config import DATABASE_URL
+from src.config import (
+    DATABASE_URL,
+    DB_ECHO,
+    DB_SLOW_QUERY_THRESHOLD,
+    DB_POOL_SIZE,
+    DB_MAX_OVERFLOW,
+    DB_POOL_TIMEOUT,
+    DB_POOL_RECYCLE,
+    DB_POOL_PRE_PING,
+    DB_POOL_WARM_SIZE,
+    DB_STATEMENT_CACHE_SIZE,
+    DB_PREPARED_STATEMENT_CACHE_SIZE,
+)
+from src.metrics import InstrumentedPool, instrument_engine
+
+def build_engine(url: str = DATABASE_URL) -> AsyncEngine:
+    """
+    Creates an instrumented engine from the DB_* settings in src.config.
+    Called once at startup; no connection is opened until the pool is used.
+    """
+    engine = create_async_engine(
+        url,
+        echo=DB_ECHO,
+        poolclass=InstrumentedPool,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=DB_POOL_PRE_PING,
+        connect_args={
+            "statement_cache_size": DB_STATEMENT_CACHE_SIZE,
+            "prepared_statement_cache_size": DB_PREPARED_STATEMENT_CACHE_SIZE,
+        },
+    )
+    instrument_engine(engine, DB_SLOW_QUERY_THRESHOLD)
+    return engine
+
+def pool_stats(engine: AsyncEngine) -> dict:
+    """
+    Current pool usage, for logs and capacity planning.
+    """
+    pool = engine.sync_engine.pool
+    return {
+        "size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "checked_in": pool.checkedin(),
+        "overflow": max(pool.overflow(), 0),
+        "capacity": pool.size() + pool._max_overflow,
+    }
 
-engine = create_async_engine(DATABASE_URL, echo=True)
-async_session = async_sessionmaker(engine, expire_on_commit=False)
+async def warm_pool(engine: AsyncEngine, connections: int = DB_POOL_WARM_SIZE) -> None:
+    """
+    Opens `connections` pooled connections at once, so the first updates after
+    a deploy don't queue behind TCP, TLS and auth handshakes. Connections are
+    held until all of them are open, otherwise the pool would hand the same
+    one out again.
+    """
+    opened = await asyncio.gather(*(engine.connect().start() for _ in range(connections)), return_exceptions=True)
+    async with AsyncExitStack() as stack:
+        # Registered only once every connect has returned, so one that fails can't leave the others open
+        for connection in opened:
+            if isinstance(connection, AsyncConnection):
+                stack.push_async_callback(connection.close)
+        for connection in opened:
+            if isinstance(connection, BaseException):
+                raise connection
+        await asyncio.gather(*(connection.execute(text("SELECT 1")) for connection in opened))
 
 class Base(DeclarativeBase):
     pass
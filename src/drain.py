@@ -0,0 +1,90 @@
+import asyncio
+import logging
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Dict
+
+from aiohttp import web
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+from src.config import SHUTDOWN_DRAIN_TIMEOUT, SHUTDOWN_RETRY_AFTER
+
+
+class Drain:
+    """
+    Graceful shutdown of this replica.
+
+    Once started, webhook requests are refused with 503 and Retry-After, so
+    YooKassa and Telegram redeliver them (to another replica, once /readyz
+    took this one out of rotation) instead of having them cut off mid-
+    transaction. Shutdown then waits, up to one deadline for all steps,
+    for the webhook requests and Telegram updates already being handled.
+    """
+
+    def __init__(self, retry_after: int = SHUTDOWN_RETRY_AFTER):
+        self.retry_after = retry_after
+        self.draining = False
+        self._deadline = 0.0
+        self._in_flight = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+    def start(self, timeout: float = SHUTDOWN_DRAIN_TIMEOUT) -> None:
+        self.draining = True
+        self._deadline = asyncio.get_running_loop().time() + timeout
+        logging.info(f"Draining: refusing webhooks, waiting up to {timeout:.0f}s for {self._in_flight} requests and updates in flight.")
+
+    def remaining(self) -> float:
+        """
+        Seconds left until the drain deadline.
+        """
+        return max(self._deadline - asyncio.get_running_loop().time(), 0)
+
+    @contextmanager
+    def track(self):
+        self._in_flight += 1
+        self._idle.clear()
+        try:
+            yield
+        finally:
+            self._in_flight -= 1
+            if not self._in_flight:
+                self._idle.set()
+
+    async def wait_idle(self) -> None:
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout=self.remaining())
+        except asyncio.TimeoutError:
+            logging.warning(f"Drain deadline passed with {self._in_flight} requests and updates still in flight.")
+
+    @web.middleware
+    async def middleware(self, request: web.Request, handler: Callable[[web.Request], Awaitable[web.StreamResponse]]) -> web.StreamResponse:
+        """
+        aiohttp middleware: refuses and tracks the webhook POSTs. /metrics and
+        the probes keep answering while draining.
+        """
+        if request.method != "POST":
+            return await handler(request)
+        if self.draining:
+            return web.Response(status=503, text="Shutting down", headers={"Retry-After": str(self.retry_after)})
+        with self.track():
+            return await handler(request)
+
+
+class DrainMiddleware(BaseMiddleware):
+    """
+    Outer middleware on dp.update: lets shutdown wait for the updates being
+    handled. Neither start_polling nor the background webhook handler does.
+    """
+
+    def __init__(self, drain: Drain):
+        self.drain = drain
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        with self.drain.track():
+            return await handler(event, data)
@@ -0,0 +1,125 @@
+import json
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Mapping
+
+from aiogram.exceptions import DataNotDictLikeError
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder, KeyBuilder, StateType, StorageKey
+from sqlalchemy import select, delete
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from src.config import FSM_CACHE_TTL, FSM_CACHE_SIZE
+from src.metrics import CACHE_LOOKUPS, CACHE_ENTRIES
+from src.models import FsmState
+
+
+@dataclass
+class _Record:
+    state: str | None = None
+    data: dict[str, Any] = field(default_factory=dict)
+    expires_at: float = 0.0
+
+
+class PostgresStorage(BaseStorage):
+    """
+    aiogram FSM storage kept in the fsm_states table.
+
+    Writes go straight to the table, one upsert per call (cleared states
+    are deleted instead), so an acknowledged write survives a crash and is
+    visible to every replica right away. Reads go through a bounded
+    in-process cache with a short TTL: it covers the several reads of one
+    update (the FSM middleware's get_state, then the handler's get_data)
+    without a round trip each, while a state changed by another replica is
+    seen here at most `cache_ttl` seconds late.
+    """
+
+    def __init__(
+        self,
+        async_session: async_sessionmaker,
+        key_builder: KeyBuilder | None = None,
+        cache_ttl: float = FSM_CACHE_TTL,
+        cache_size: int = FSM_CACHE_SIZE,
+    ):
+        self.async_session = async_session
+        self.key_builder = key_builder or DefaultKeyBuilder()
+        self.cache_ttl = cache_ttl
+        self.cache_size = cache_size
+        self._records: OrderedDict[str, _Record] = OrderedDict()
+        # Bumped on every write; a load that overlaps one is not cached
+        self._writes = 0
+        self._hits = CACHE_LOOKUPS.labels("fsm", "hit")
+        self._misses = CACHE_LOOKUPS.labels("fsm", "miss")
+        CACHE_ENTRIES.labels("fsm").set_function(lambda: len(self._records))
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        state = state.state if isinstance(state, State) else state
+        await self._write(self.key_builder.build(key), state=state)
+
+    async def get_state(self, key: StorageKey) -> str | None:
+        return (await self._record(key)).state
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        if not isinstance(data, dict):
+            raise DataNotDictLikeError(f"Data must be a dict or dict-like object, got {type(data).__name__}")
+        # Round-trip through JSON so the cache holds exactly what Postgres
+        # would return, and unserializable values fail in the handler
+        await self._write(self.key_builder.build(key), data=json.loads(json.dumps(data)))
+
+    async def get_data(self, key: StorageKey) -> dict[str, Any]:
+        return (await self._record(key)).data.copy()
+
+    async def close(self) -> None:
+        # Nothing is buffered; the engine is disposed by the application
+        pass
+
+    async def _record(self, key: StorageKey) -> _Record:
+        storage_key = self.key_builder.build(key)
+        record = self._records.get(storage_key)
+        if record is not None and record.expires_at > time.monotonic():
+            self._records.move_to_end(storage_key)
+            self._hits.inc()
+            return record
+
+        self._misses.inc()
+        writes = self._writes
+        async with self.async_session() as session:
+            row = (await session.execute(
+                select(FsmState.state, FsmState.data).where(FsmState.key == storage_key)
+            )).first()
+        loaded = _Record(row.state, row.data) if row else _Record()
+        loaded.expires_at = time.monotonic() + self.cache_ttl
+
+        if writes == self._writes:
+            self._records[storage_key] = loaded
+            self._records.move_to_end(storage_key)
+            if len(self._records) > self.cache_size:
+                self._records.popitem(last=False)
+        return loaded
+
+    async def _write(self, storage_key: str, **values: Any) -> None:
+        """
+        Upserts the given columns of one record, then updates its cached copy.
+        """
+        self._writes += 1
+        async with self.async_session() as session:
+            statement = insert(FsmState).values(**{"key": storage_key, "state": None, "data": {}, "updated_at": datetime.now(), **values})
+            await session.execute(statement.on_conflict_do_update(
+                index_elements=[FsmState.key],
+                set_={column: getattr(statement.excluded, column) for column in [*values, "updated_at"]},
+            ))
+            if not any(values.values()):
+                # state.clear() sets both halves to empty; the row goes once both are
+                await session.execute(
+                    delete(FsmState).where(FsmState.key == storage_key, FsmState.state.is_(None), FsmState.data == {})
+                )
+            await session.commit()
+
+        record = self._records.get(storage_key)
+        if record is not None:
+            for column, value in values.items():
+                setattr(record, column, value)
+            record.expires_at = time.monotonic() + self.cache_ttl
@@ -1,10 +1,12 @@
 from aiogram import Router, F
-from aiogram.types import ChatMemberUpdated
+from aiogram.types import ChatMemberUpdated, Message
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 
 from src.models import Subscription, SubscriptionStatus
 from src.config import GROUP_ID
+from src.subscription_cache import subscription_cache, invalidation_notice
+from src.bot_metadata import bot_metadata
 
 group_router = Router()
 
@@ -25,7 +27,9 @@ async def chat_member_handler(event: ChatMemberUpdated, async_session: AsyncSess
             if subscription:
                 # Update the subscription status to active
                 subscription.status = SubscriptionStatus.active
+                await session.execute(invalidation_notice([user_id]))
                 await session.commit()
+                subscription_cache.invalidate(user_id)
                 # Optionally, send a welcome message to the user in the group
                 # await event.bot.send_message(event.chat.id, f"Welcome, {event.new_chat_member.user.full_name}! Your subscription is now active.")
             else:
@@ -33,3 +37,13 @@ async def chat_member_handler(event: ChatMemberUpdated, async_session: AsyncSess
                 # This could be an old link, or an issue.
                 # Optionally, kick the user or log the event.
                 pass
+
+@group_router.message(F.chat.id == int(GROUP_ID), F.new_chat_title)
+async def group_title_changed_handler(message: Message) -> None:
+    # Keep the cached group title used in payment confirmations up to date
+    bot_metadata.set_group_title(message.new_chat_title)
+
+@group_router.my_chat_member(F.chat.id == int(GROUP_ID))
+async def bot_membership_changed_handler(event: ChatMemberUpdated) -> None:
+    # The bot was re-added or its rights changed; re-read the group on next use
+    bot_metadata.invalidate_group()
@@ -1,109 +1,78 @@
-from aiogram import Router, html, F
+from aiogram import Router, html
 from aiogram.filters import CommandStart, Command
 from aiogram.types import Message
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
 from datetime import datetime
 
-from src.models import User, Subscription, SubscriptionStatus
 from src.keyboards.user_keyboards import get_main_menu_keyboard, get_my_subscription_keyboard
-from src.lexicon import lexicon
+from src.lexicon import Texts, TextKey
+from src.user_registry import user_registry
+from src.subscription_cache import subscription_cache
 
 user_router = Router()
 
-@user_router.message(CommandStart())
-async def command_start_handler(message: Message, async_session: AsyncSession) -> None:
+async def greet_user(message: Message, async_session: AsyncSession, texts: Texts) -> None:
     """
-    This handler receives messages with `/start` command
+    Registers the user on first contact and shows the start message.
     """
-    async with async_session() as session:
-        user = await session.execute(select(User).filter_by(telegram_id=message.from_user.id))
-        user = user.scalar_one_or_none()
-
-        if not user:
-            new_user = User(
-                telegram_id=message.from_user.id,
-                full_name=message.from_user.full_name,
-                username=message.from_user.username
-            )
-            session.add(new_user)
-            await session.commit()
-            await message.answer(lexicon['welcome']['new_user_registered'])
+    if await user_registry.ensure_registered(async_session, message.from_user):
+        await message.answer(texts('welcome.new_user_registered'))
     
     await message.answer(
-        lexicon['welcome']['start_message'],
-        reply_markup=get_main_menu_keyboard()
+        texts('welcome.start_message'),
+        reply_markup=get_main_menu_keyboard(texts)
     )
-    await message.answer(lexicon['general']['info_message'])
+    await message.answer(texts('general.info_message'))
+
+@user_router.message(CommandStart())
+async def command_start_handler(message: Message, async_session: AsyncSession, texts: Texts) -> None:
+    """
+    This handler receives messages with `/start` command
+    """
+    await greet_user(message, async_session, texts)
 
 @user_router.message(Command('status'))
-@user_router.message(F.text == lexicon['buttons']['main_menu']['my_subscription'])
-async def my_subscription_handler(message: Message, async_session: AsyncSession) -> None:
+@user_router.message(TextKey('buttons.main_menu.my_subscription'))
+async def my_subscription_handler(message: Message, async_session: AsyncSession, texts: Texts) -> None:
     """
     Handler for the 'My Subscription' button.
     Prioritizes showing active subscription status.
     """
-    async with async_session() as session:
-        # First, try to find an active subscription
-        active_subscription_result = await session.execute(
-            select(Subscription)
-            .filter_by(user_id=message.from_user.id, status=SubscriptionStatus.active)
-            .order_by(Subscription.end_date.desc())
-        )
-        active_subscription = active_subscription_result.scalars().first()
+    subscription = await subscription_cache.get(async_session, message.from_user.id)
 
-        if active_subscription and active_subscription.end_date > datetime.now():
-            days_left = (active_subscription.end_date - datetime.now()).days
-            text = lexicon['subscription']['active_status'].format(
-                end_date=active_subscription.end_date.strftime("%d.%m.%Y"),
-                days_left=days_left
-            )
-            is_active = True
-        else:
-            text = lexicon['subscription']['inactive_status']
-            is_active = False
-            
-        await message.answer(text, reply_markup=get_my_subscription_keyboard(is_active))
+    if subscription.is_active:
+        days_left = (subscription.end_date - datetime.now()).days
+        text = texts(
+            'subscription.active_status',
+            end_date=subscription.end_date.strftime("%d.%m.%Y"),
+            days_left=days_left
+        )
+    else:
+        text = texts('subscription.inactive_status')
+        
+    await message.answer(text, reply_markup=get_my_subscription_keyboard(texts, subscription.is_active))
 
-@user_router.message(F.text == lexicon['buttons']['main_menu']['help'])
+@user_router.message(TextKey('buttons.main_menu.help'))
 @user_router.message(Command('help'))
-async def help_handler(message: Message, async_session: AsyncSession) -> None:
+async def help_handler(message: Message, async_session: AsyncSession, texts: Texts) -> None:
     """
     Handler for the 'Help' button and /help command.
     Displays the start message.
     """
-    async with async_session() as session:
-        user = await session.execute(select(User).filter_by(telegram_id=message.from_user.id))
-        user = user.scalar_one_or_none()
-
-        if not user:
-            new_user = User(
-                telegram_id=message.from_user.id,
-                full_name=message.from_user.full_name,
-                username=message.from_user.username
-            )
-            session.add(new_user)
-            await session.commit()
-            await message.answer(lexicon['welcome']['new_user_registered'])
-    
-    await message.answer(
-        lexicon['welcome']['start_message'],
-        reply_markup=get_main_menu_keyboard()
-    )
-    await message.answer(lexicon['general']['info_message'])
+    await greet_user(message, async_session, texts)
 
 @user_router.message(Command('info'))
-async def info_command_handler(message: Message) -> None:
+async def info_command_handler(message: Message, texts: Texts) -> None:
     """
     Handler for the /info command.
     Displays information about contributions.
     """
-    await message.answer(lexicon['general']['info_message'])
+    await message.answer(texts('general.info_message'))
 
 @user_router.message()
-async def echo_handler(message: Message) -> None:
+async def echo_handler(message: Message, texts: Texts) -> None:
     """
     Handler for unhandled messages.
     """
-    await message.answer(lexicon['general']['unhandled_message'])
+    await message.answer(texts('general.unhandled_message'))
 
@@ -0,0 +1,79 @@
+import logging
+import time
+from contextlib import contextmanager
+from typing import Awaitable, Dict, TypeVar
+
+from aiohttp import web
+
+from src.metrics import STARTUP_PHASE_DURATION
+
+T = TypeVar("T")
+
+
+class Readiness:
+    """
+    Startup progress of this process, as reported by /healthz and /readyz.
+
+    /healthz answers as soon as the web server is up, so a slow start is not
+    mistaken for a hung process. /readyz answers 503 until every startup
+    phase has finished, so a rolling deploy only routes traffic to instances
+    whose pool and caches are warm.
+    """
+
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.ready = False
+        self.draining = False
+        self.phases: Dict[str, float] = {}
+
+    @contextmanager
+    def phase(self, name: str):
+        """
+        Times a startup phase, logs it and exports it as startup_phase_duration_seconds.
+        """
+        started = time.perf_counter()
+        try:
+            yield
+        except BaseException:
+            logging.error(f"Startup phase '{name}' failed after {time.perf_counter() - started:.3f}s")
+            raise
+        duration = time.perf_counter() - started
+        self.phases[name] = round(duration, 3)
+        STARTUP_PHASE_DURATION.labels(name).set(duration)
+        logging.info(f"Startup phase '{name}' took {duration:.3f}s")
+
+    async def timed(self, name: str, awaitable: Awaitable[T]) -> T:
+        """
+        phase() for an awaitable, so independent phases can run under asyncio.gather.
+        """
+        with self.phase(name):
+            return await awaitable
+
+    def mark_ready(self) -> None:
+        total = time.perf_counter() - self.started_at
+        self.ready = True
+        STARTUP_PHASE_DURATION.labels("total").set(total)
+        logging.info(f"Startup finished in {total:.3f}s, instance is ready.")
+
+    def mark_draining(self) -> None:
+        self.ready = False
+        self.draining = True
+
+
+async def healthz_handler(request: web.Request) -> web.Response:
+    """
+    Liveness: the event loop is running and serving requests.
+    """
+    return web.json_response({"status": "ok"})
+
+
+async def readyz_handler(request: web.Request) -> web.Response:
+    """
+    Readiness: 200 once startup finished, 503 before that and while draining,
+    with the phase timings either way.
+    """
+    readiness: Readiness = request.app["readiness"]
+    return web.json_response(
+        {"ready": readiness.ready, "draining": readiness.draining, "phases": readiness.phases},
+        status=200 if readiness.ready else 503,
+    )
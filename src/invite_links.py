@@ -0,0 +1,191 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+
+from aiogram import Bot
+from aiogram.methods import CreateChatInviteLink
+from sqlalchemy import select, update, delete, func, literal, or_, and_
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker
+
+from src.config import (
+    GROUP_ID,
+    INVITE_LINK_POOL_SIZE,
+    INVITE_LINK_LIFETIME_HOURS,
+    INVITE_LINK_MIN_REMAINING_HOURS,
+    INVITE_LINK_REFILL_INTERVAL,
+    INVITE_LINK_REFILL_BATCH,
+)
+from src.models import InviteLink
+from src.outbound import OutboundDispatcher
+
+# Advisory lock that keeps replicas from refilling at the same time
+REFILL_LOCK_KEY = func.hashtext(literal("invite_link_pool"))
+
+
+class InviteLinkPool:
+    """
+    Stock of pre-generated single-use invite links, kept in the invite_links table.
+
+    issue() claims a link with UPDATE ... WHERE id = (SELECT ... FOR UPDATE
+    SKIP LOCKED) RETURNING, so concurrent payments never share a link and
+    granting access needs no Telegram call. Only when the pool is empty is a
+    link created on the spot.
+
+    A background task tops the pool up through the outbound dispatcher and
+    drops links that no longer have enough validity left to hand out, as
+    well as claimed links that have expired. Nobody knows the dropped links,
+    so they are left to expire rather than revoked. A session-level advisory
+    lock keeps replicas from refilling at the same time; the Telegram calls
+    are made outside any transaction.
+    """
+
+    def __init__(
+        self,
+        bot: Bot,
+        outbound: OutboundDispatcher,
+        engine: AsyncEngine,
+        async_session: async_sessionmaker,
+        chat_id: int | None = None,
+        size: int = INVITE_LINK_POOL_SIZE,
+        lifetime: timedelta = timedelta(hours=INVITE_LINK_LIFETIME_HOURS),
+        min_remaining: timedelta = timedelta(hours=INVITE_LINK_MIN_REMAINING_HOURS),
+        refill_interval: float = INVITE_LINK_REFILL_INTERVAL,
+        refill_batch: int = INVITE_LINK_REFILL_BATCH,
+    ):
+        self.bot = bot
+        self.outbound = outbound
+        self.engine = engine
+        self.async_session = async_session
+        self.chat_id = chat_id if chat_id is not None else int(GROUP_ID)
+        self.size = size
+        self.lifetime = lifetime
+        self.min_remaining = min_remaining
+        self.refill_interval = refill_interval
+        self.refill_batch = refill_batch
+        self._wakeup = asyncio.Event()
+        self._refill_task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        self._refill_task = asyncio.create_task(self._refill_loop(), name="invite-link-pool")
+        logging.info(f"Invite link pool started, keeping {self.size} links.")
+
+    async def stop(self) -> None:
+        if self._refill_task is not None:
+            self._refill_task.cancel()
+            await asyncio.gather(self._refill_task, return_exceptions=True)
+            self._refill_task = None
+
+    async def issue(self, user_id: int) -> str:
+        """
+        Returns a single-use invite link for the user, from the pool if possible.
+        """
+        link = await self._claim(user_id)
+        # Top up right away during payment bursts instead of waiting for the next interval
+        self._wakeup.set()
+        if link is not None:
+            return link
+
+        logging.warning(f"Invite link pool is empty, creating a link for user {user_id} directly.")
+        invite_link = await self.bot.create_chat_invite_link(
+            chat_id=self.chat_id,
+            member_limit=1,
+            expire_date=datetime.now() + self.lifetime,
+        )
+        return invite_link.invite_link
+
+    async def _claim(self, user_id: int) -> str | None:
+        now = datetime.now()
+        async with self.async_session() as session:
+            available_link = (
+                select(InviteLink.id)
+                .where(InviteLink.claimed_at.is_(None), InviteLink.expire_date > now + self.min_remaining)
+                .order_by(InviteLink.expire_date)
+                .limit(1)
+                .with_for_update(skip_locked=True)
+                .scalar_subquery()
+            )
+            link = (await session.execute(
+                update(InviteLink)
+                .where(InviteLink.id == available_link)
+                .values(claimed_at=now, claimed_by=user_id)
+                .returning(InviteLink.invite_link)
+            )).scalar_one_or_none()
+            await session.commit()
+        return link
+
+    async def _refill_loop(self) -> None:
+        while True:
+            self._wakeup.clear()
+            try:
+                missing = await self.refill()
+            except Exception as e:
+                logging.error(f"Could not refill the invite link pool: {e}")
+                missing = 0
+            if missing > 0:
+                # Created a full batch and the pool is still short
+                continue
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.refill_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def refill(self) -> int:
+        """
+        Drops stale links and creates up to one batch of new ones.
+        Returns how many links the pool is still short of.
+        """
+        # The lock belongs to this connection, not to a transaction, so no
+        # transaction stays open while the batch waits on Telegram's rate limits
+        async with self.engine.connect() as lock_connection:
+            locked = (await lock_connection.execute(select(func.pg_try_advisory_lock(REFILL_LOCK_KEY)))).scalar()
+            await lock_connection.commit()
+            if not locked:
+                return 0
+            try:
+                return await self._refill()
+            finally:
+                await lock_connection.execute(select(func.pg_advisory_unlock(REFILL_LOCK_KEY)))
+                await lock_connection.commit()
+
+    async def _refill(self) -> int:
+        now = datetime.now()
+        async with self.async_session() as session:
+            await session.execute(
+                delete(InviteLink).where(or_(
+                    and_(InviteLink.claimed_at.is_(None), InviteLink.expire_date <= now + self.min_remaining),
+                    InviteLink.expire_date <= now,
+                ))
+            )
+            available = (await session.execute(
+                select(func.count()).select_from(InviteLink).where(InviteLink.claimed_at.is_(None))
+            )).scalar_one()
+            await session.commit()
+        to_create = min(self.size - available, self.refill_batch)
+        if to_create <= 0:
+            return 0
+
+        expire_date = now + self.lifetime
+        results = await asyncio.gather(*[
+            await self.outbound.submit(
+                CreateChatInviteLink(chat_id=self.chat_id, member_limit=1, expire_date=expire_date),
+                job="invite_link_pool",
+            )
+            for _ in range(to_create)
+        ], return_exceptions=True)
+        # Calls cancelled by a shutdown come back as CancelledError, which is not an Exception
+        created = [result.invite_link for result in results if not isinstance(result, BaseException)]
+        for error in {repr(result) for result in results if isinstance(result, BaseException)}:
+            logging.error(f"Could not create a pooled invite link: {error}")
+
+        if created:
+            async with self.async_session() as session:
+                await session.execute(
+                    insert(InviteLink)
+                    .values([{"invite_link": link, "expire_date": expire_date, "created_at": now} for link in created])
+                    .on_conflict_do_nothing(index_elements=[InviteLink.invite_link])
+                )
+                await session.commit()
+            logging.info(f"Invite link pool: added {len(created)} links, {available + len(created)}/{self.size} available.")
+        # Stop early on errors; the next interval retries
+        return self.size - available - len(created) if len(created) == to_create else 0
@@ -1,46 +1,59 @@
+from functools import wraps
+
 from aiogram.types import ReplyKeyboardMarkup, KeyboardButton, InlineKeyboardMarkup, InlineKeyboardButton
-from src.lexicon import lexicon
+from src.lexicon import Texts
+from src.tariffs import tariff_catalog
+
+def _built_once_per_locale(build):
+    """
+    These keyboards only depend on the locale and their flags, so each
+    variant is built on first use and the same object is returned afterwards.
+    """
+    keyboards = {}
+
+    @wraps(build)
+    def get(texts: Texts, *args):
+        key = (texts.locale, *args)
+        keyboard = keyboards.get(key)
+        if keyboard is None:
+            keyboard = keyboards[key] = build(texts, *args)
+        return keyboard
+    return get
 
-def get_main_menu_keyboard() -> ReplyKeyboardMarkup:
+@_built_once_per_locale
+def get_main_menu_keyboard(texts: Texts) -> ReplyKeyboardMarkup:
     """
     Returns the main menu keyboard.
     """
     return ReplyKeyboardMarkup(
         keyboard=[
             [
-                KeyboardButton(text=lexicon['buttons']['main_menu']['tariffs']),
-                KeyboardButton(text=lexicon['buttons']['main_menu']['my_subscription']),
+                KeyboardButton(text=texts('buttons.main_menu.tariffs')),
+                KeyboardButton(text=texts('buttons.main_menu.my_subscription')),
             ],
             [
-                KeyboardButton(text=lexicon['buttons']['main_menu']['help']),
+                KeyboardButton(text=texts('buttons.main_menu.help')),
             ]
         ],
         resize_keyboard=True,
     )
 
-def get_tariffs_keyboard() -> InlineKeyboardMarkup:
+def get_tariffs_keyboard(texts: Texts) -> InlineKeyboardMarkup:
     """
-    Returns the tariff selection keyboard.
+    Returns the tariff selection keyboard, built from the tariffs table.
     """
-    return InlineKeyboardMarkup(
-        inline_keyboard=[
-            [InlineKeyboardButton(text="1500р - 1 месяц", callback_data="tariff_1500")],
-            [InlineKeyboardButton(text="2900р - 1 месяц", callback_data="tariff_2900")],
-            [InlineKeyboardButton(text="3900р - 1 месяц", callback_data="tariff_3900")],
-            [InlineKeyboardButton(text="4900р - 1 месяц", callback_data="tariff_4900")],
-            [InlineKeyboardButton(text=lexicon['buttons']['tariffs_menu']['custom_amount'], callback_data="tariff_custom")],
-        ]
-    )
+    return tariff_catalog.keyboard(texts)
 
-def get_my_subscription_keyboard(is_active: bool) -> InlineKeyboardMarkup:
+@_built_once_per_locale
+def get_my_subscription_keyboard(texts: Texts, is_active: bool) -> InlineKeyboardMarkup:
     """
     Returns the keyboard for the 'My Subscription' section.
     """
     if is_active:
-        button_text = lexicon['buttons']['my_subscription_menu']['renew_subscription']
+        button_text = texts('buttons.my_subscription_menu.renew_subscription')
         callback_data = "renew_subscription"
     else:
-        button_text = lexicon['buttons']['my_subscription_menu']['buy_subscription']
+        button_text = texts('buttons.my_subscription_menu.buy_subscription')
         callback_data = "buy_subscription"
         
     return InlineKeyboardMarkup(
@@ -49,15 +62,16 @@ def get_my_subscription_keyboard(is_active: bool) -> InlineKeyboardMarkup:
         ]
     )
 
-def get_payment_confirmation_keyboard() -> InlineKeyboardMarkup:
+@_built_once_per_locale
+def get_payment_confirmation_keyboard(texts: Texts) -> InlineKeyboardMarkup:
     """
     Returns the keyboard for payment confirmation.
     """
     return InlineKeyboardMarkup(
         inline_keyboard=[
             [
-                InlineKeyboardButton(text=lexicon['buttons']['pay'], callback_data="confirm_payment"),
-                InlineKeyboardButton(text=lexicon['buttons']['confirm_cancel'], callback_data="cancel_payment")
+                InlineKeyboardButton(text=texts('buttons.pay'), callback_data="confirm_payment"),
+                InlineKeyboardButton(text=texts('buttons.confirm_cancel'), callback_data="cancel_payment")
             ]
         ]
     )
\ No newline at end of file
@@ -1,34 +1,153 @@
 import json
-from typing import Dict
-
-def load_lexicon(language: str = 'ru') -> Dict:
-    """Загружает тексты из файла JSON."""
-    try:
-        with open(f'src/locales/{language}.json', 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except FileNotFoundError:
-        # Fallback to default language if requested language file is not found
-        print(f"Warning: Lexicon file for language '{language}' not found. Loading 'ru.json' instead.")
-        with open('src/locales/ru.json', 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except json.JSONDecodeError as e:
-        print(f"Error decoding lexicon JSON for language '{language}': {e}")
-        # In a real application, you might want to raise an error or handle this more gracefully
-        return {} # Return empty dict on error
-
-# Load the lexicon when this module is imported
-lexicon: Dict = load_lexicon()
-
-# You can also add a function to get text safely
-def get_text(key: str, default: str = "", **kwargs) -> str:
-    parts = key.split('.')
-    current = lexicon
-    for part in parts:
-        if isinstance(current, dict) and part in current:
-            current = current[part]
+import logging
+from pathlib import Path
+from string import Formatter
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.filters import Filter
+from aiogram.types import Message, TelegramObject
+
+from src.config import DEFAULT_LOCALE
+
+# Resolved from the package, so the bot can be started from any directory
+LOCALES_DIR = Path(__file__).resolve().parent / "locales"
+
+
+def _flatten(tree: Dict, prefix: str = "") -> Dict[str, str]:
+    flat = {}
+    for key, value in tree.items():
+        if isinstance(value, dict):
+            flat.update(_flatten(value, f"{prefix}{key}."))
         else:
-            return default # Key not found
+            flat[f"{prefix}{key}"] = value
+    return flat
+
+
+def _compile(template: str) -> str | Callable[..., str]:
+    """
+    Templates without placeholders are rendered once; the rest become their
+    bound str.format. Malformed templates fail here, at load time.
+    """
+    if any(field is not None for _, field, _, _ in Formatter().parse(template)):
+        return template.format
+    return template.format()
+
+
+class Texts:
+    """
+    Message templates of one locale, keyed by their dotted path:
+
+        texts("payment.min_amount_error", min_amount=100)
+    """
+
+    __slots__ = ("locale", "_templates")
+
+    def __init__(self, locale: str, templates: Dict[str, str | Callable[..., str]]):
+        self.locale = locale
+        self._templates = templates
+
+    def __call__(self, key: str, **kwargs) -> str:
+        template = self._templates[key]
+        return template if isinstance(template, str) else template(**kwargs)
+
+
+class Lexicon:
+    """
+    Catalog of all locales in src/locales.
+
+    Nothing is read on import. The directory is scanned and every locale
+    file read, flattened and compiled by warm() at startup; without it,
+    on first use. Keys a locale lacks fall back to the default locale.
+    Unknown languages get the default locale.
+    """
+
+    def __init__(self, locales_dir: Path = LOCALES_DIR, default_locale: str = DEFAULT_LOCALE):
+        self.locales_dir = locales_dir
+        self.default_locale = default_locale
+        self._available: set[str] | None = None
+        self._texts: Dict[str, Texts] = {}
+
+    @property
+    def available(self) -> set[str]:
+        """
+        Locales with a file in locales_dir, scanned on first use.
+        """
+        if self._available is None:
+            available = {path.stem for path in self.locales_dir.glob("*.json")}
+            if self.default_locale not in available:
+                raise FileNotFoundError(f"Lexicon file for the default locale '{self.default_locale}' not found in {self.locales_dir}")
+            self._available = available
+        return self._available
+
+    def resolve(self, language_code: str | None) -> str:
+        """
+        Maps a Telegram language_code such as "en" or "pt-br" to a locale we have.
+        """
+        if language_code:
+            language = language_code.split("-")[0].lower()
+            if language in self.available:
+                return language
+        return self.default_locale
+
+    def texts(self, language_code: str | None = None) -> Texts:
+        locale = self.resolve(language_code)
+        texts = self._texts.get(locale)
+        if texts is None:
+            texts = self._texts[locale] = self._load(locale)
+        return texts
+
+    def warm(self) -> None:
+        """
+        Loads every locale up front, so a malformed file fails the startup
+        rather than the first message in that language.
+        """
+        for locale in sorted(self.available, key=lambda locale: locale != self.default_locale):
+            self.texts(locale)
+
+    def _load(self, locale: str) -> Texts:
+        # Also the first scan of the directory when texts() comes before warm()
+        if locale not in self.available:
+            raise FileNotFoundError(f"Lexicon file for locale '{locale}' not found in {self.locales_dir}")
+        with open(self.locales_dir / f"{locale}.json", "r", encoding="utf-8") as f:
+            templates = {key: _compile(template) for key, template in _flatten(json.load(f)).items()}
+        if locale != self.default_locale:
+            templates = {**self.texts()._templates, **templates}
+        logging.info(f"Loaded lexicon for locale '{locale}' ({len(templates)} messages)")
+        return Texts(locale, templates)
+
+
+class LexiconMiddleware(BaseMiddleware):
+    """
+    Outer middleware on dp.update: passes handlers and filters the `texts`
+    of the user's language.
+    """
+
+    def __init__(self, catalog: Lexicon | None = None):
+        self.catalog = catalog or lexicon
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        user = data.get("event_from_user")
+        data["texts"] = self.catalog.texts(user.language_code if user else None)
+        return await handler(event, data)
+
+
+class TextKey(Filter):
+    """
+    Matches a message whose text is the given lexicon entry in the user's language,
+    e.g. a reply keyboard button.
+    """
+
+    def __init__(self, key: str):
+        self.key = key
+
+    async def __call__(self, message: Message, texts: Texts) -> bool:
+        return message.text == texts(self.key)
+
 
-    if isinstance(current, str):
-        return current.format(**kwargs)
-    return default
+lexicon = Lexicon()
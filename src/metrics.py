@@ -0,0 +1,200 @@
+import hmac
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict
+
+from aiohttp import web
+from aiogram import BaseMiddleware, Router
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.dispatcher.event.bases import UNHANDLED
+from aiogram.types import TelegramObject
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+from sqlalchemy import event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from src.config import METRICS_TOKEN
+
+# Buckets for in-process work and round trips to Postgres, YooKassa and Telegram
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+JOB_BUCKETS = (1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600)
+
+UPDATE_DURATION = Histogram(
+    "bot_update_duration_seconds", "Time to process a Telegram update, middlewares included.",
+    ["update_type", "outcome"], buckets=LATENCY_BUCKETS,
+)
+HANDLER_DURATION = Histogram(
+    "bot_handler_duration_seconds", "Time spent in a single aiogram handler.",
+    ["handler", "outcome"], buckets=LATENCY_BUCKETS,
+)
+DB_QUERY_DURATION = Histogram(
+    "db_query_duration_seconds", "Time to execute a SQL statement.",
+    ["statement"], buckets=LATENCY_BUCKETS,
+)
+DB_QUERY_ERRORS = Counter("db_query_errors_total", "SQL statements that raised.", ["statement"])
+DB_POOL_CHECKOUT_WAIT = Histogram(
+    "db_pool_checkout_wait_seconds", "Time spent waiting for a pooled connection.",
+    buckets=LATENCY_BUCKETS,
+)
+DB_POOL_CHECKED_OUT = Gauge("db_pool_checked_out_connections", "Connections currently checked out of the pool.")
+DB_POOL_OVERFLOW = Gauge("db_pool_overflow_connections", "Connections open beyond pool_size.")
+DB_POOL_CAPACITY = Gauge("db_pool_capacity_connections", "pool_size plus max_overflow.")
+DB_POOL_CHECKOUT_TIMEOUTS = Counter("db_pool_checkout_timeouts_total", "Checkouts that gave up after pool_timeout.")
+YOOKASSA_REQUEST_DURATION = Histogram(
+    "yookassa_request_duration_seconds", "Time of a single YooKassa API attempt.",
+    ["method", "endpoint", "status"], buckets=LATENCY_BUCKETS,
+)
+TELEGRAM_REQUEST_DURATION = Histogram(
+    "telegram_request_duration_seconds", "Time of a single Bot API call.",
+    ["method", "status"], buckets=LATENCY_BUCKETS,
+)
+SCHEDULER_JOB_DURATION = Histogram(
+    "scheduler_job_duration_seconds", "Duration of a scheduler job run.",
+    ["job"], buckets=JOB_BUCKETS,
+)
+SCHEDULER_ROWS_PROCESSED = Counter(
+    "scheduler_rows_processed_total", "Rows handled by scheduler jobs.", ["job", "result"],
+)
+WEBHOOK_QUEUE_DEPTH = Gauge("webhook_inbox_pending_events", "YooKassa events waiting in the inbox.")
+OUTBOUND_QUEUE_DEPTH = Gauge("outbound_queue_depth", "Bot API calls waiting in the outbound dispatcher.")
+CACHE_LOOKUPS = Counter("cache_lookups_total", "Lookups in the in-process caches.", ["cache", "result"])
+CACHE_ENTRIES = Gauge("cache_entries", "Entries held by the in-process caches.", ["cache"])
+USERS_REGISTERED = Counter("users_registered_total", "Users stored on their first /start or /help.")
+STARTUP_PHASE_DURATION = Gauge("startup_phase_duration_seconds", "Duration of each startup phase of this process.", ["phase"])
+
+
+def _outcome(result: Any) -> str:
+    return "unhandled" if result is UNHANDLED else "handled"
+
+
+class UpdateMetricsMiddleware(BaseMiddleware):
+    """
+    Outer middleware on dp.update: times every update end to end.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        started = time.perf_counter()
+        outcome = "error"
+        try:
+            result = await handler(event, data)
+            outcome = _outcome(result)
+            return result
+        finally:
+            UPDATE_DURATION.labels(event.event_type, outcome).observe(time.perf_counter() - started)
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """
+    Inner middleware: runs only once a handler matched, and labels by its name.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        name = data["handler"].callback.__name__
+        started = time.perf_counter()
+        outcome = "error"
+        try:
+            result = await handler(event, data)
+            outcome = _outcome(result)
+            return result
+        finally:
+            HANDLER_DURATION.labels(name, outcome).observe(time.perf_counter() - started)
+
+
+def instrument_router(router: Router) -> None:
+    for name, observer in router.observers.items():
+        if name != "error":
+            observer.middleware(HandlerMetricsMiddleware())
+
+
+class TelegramMetricsMiddleware(BaseRequestMiddleware):
+    """
+    Bot session middleware timing every Bot API call.
+    """
+
+    async def __call__(self, make_request, bot, method):
+        started = time.perf_counter()
+        status = "error"
+        try:
+            response = await make_request(bot, method)
+            status = "ok"
+            return response
+        except Exception as e:
+            status = type(e).__name__
+            raise
+        finally:
+            TELEGRAM_REQUEST_DURATION.labels(method.__api_method__, status).observe(time.perf_counter() - started)
+
+
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    """
+    The default async pool, recording how long each checkout waited.
+    """
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            DB_POOL_CHECKOUT_TIMEOUTS.inc()
+            logging.warning(f"Database pool exhausted: {self.status()}")
+            raise
+        finally:
+            DB_POOL_CHECKOUT_WAIT.observe(time.perf_counter() - started)
+
+
+def _statement_kind(statement: str) -> str:
+    return statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "OTHER"
+
+
+def instrument_engine(engine: AsyncEngine, slow_query_threshold: float = 0) -> None:
+    """
+    Times every statement and, with a threshold, logs the slow ones.
+    """
+    sync_engine = engine.sync_engine
+    pool = sync_engine.pool
+    if isinstance(pool, AsyncAdaptedQueuePool):
+        DB_POOL_CHECKED_OUT.set_function(pool.checkedout)
+        DB_POOL_OVERFLOW.set_function(lambda: max(pool.overflow(), 0))
+        DB_POOL_CAPACITY.set(pool.size() + pool._max_overflow)
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        duration = time.perf_counter() - conn.info["query_started"].pop()
+        DB_QUERY_DURATION.labels(_statement_kind(statement)).observe(duration)
+        if slow_query_threshold and duration >= slow_query_threshold:
+            logging.warning(f"Slow query ({duration:.3f}s): {' '.join(statement.split())[:1000]}")
+
+    @event.listens_for(sync_engine, "handle_error")
+    def _handle_error(exception_context):
+        stack = exception_context.connection.info.get("query_started") if exception_context.connection else None
+        if stack:
+            stack.pop()
+        DB_QUERY_ERRORS.labels(_statement_kind(exception_context.statement or "")).inc()
+
+
+async def metrics_handler(request: web.Request) -> web.Response:
+    """
+    Exposes all metrics in the Prometheus text format. Requires the
+    METRICS_TOKEN bearer token when one is configured.
+    """
+    if METRICS_TOKEN and not hmac.compare_digest(request.headers.get("Authorization", "").encode(), f"Bearer {METRICS_TOKEN}".encode()):
+        return web.Response(status=401, text="Unauthorized", headers={"WWW-Authenticate": "Bearer"})
+    outbound = request.app.get("outbound")
+    if outbound is not None:
+        OUTBOUND_QUEUE_DEPTH.set(outbound.queue_depth)
+    return web.Response(body=generate_latest(), headers={"Content-Type": CONTENT_TYPE_LATEST})
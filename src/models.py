@@ -1,4 +1,5 @@
-from sqlalchemy import BigInteger, DECIMAL, TIMESTAMP, Enum, ForeignKey, Integer, Date
+from sqlalchemy import BigInteger, Boolean, DECIMAL, TIMESTAMP, Enum, ForeignKey, Integer, Date, Index, UniqueConstraint, text
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import Mapped, mapped_column
 from src.database import Base
 import enum
@@ -20,6 +21,18 @@ class SubscriptionStatus(enum.Enum):
 
 class Subscription(Base):
     __tablename__ = 'subscriptions'
+    __table_args__ = (
+        # "My subscription" / tariff screens: active subscription of a user, newest first
+        Index('ix_subscriptions_user_id_status_end_date', 'user_id', 'status', 'end_date'),
+        # Scheduler sweeps only ever look at active subscriptions by end date;
+        # the included columns let the warning job run as an index-only scan
+        Index(
+            'ix_subscriptions_active_expiry', 'end_date', 'id',
+            postgresql_include=['user_id', 'last_warning_sent'],
+            postgresql_where=text("status = 'active'"),
+        ),
+        Index('ix_subscriptions_invite_link', 'invite_link', postgresql_where=text("invite_link IS NOT NULL")),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     user_id: Mapped[int] = mapped_column(BigInteger, ForeignKey('users.telegram_id'))
@@ -30,12 +43,30 @@ class Subscription(Base):
     invite_link: Mapped[str | None]
     last_warning_sent: Mapped[datetime.date | None] = mapped_column(Date)
 
+class Tariff(Base):
+    """
+    Fixed-price subscription options shown in the tariffs menu.
+    Changes are picked up by TariffCatalog without a restart.
+    """
+    __tablename__ = 'tariffs'
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    # Whole rubles; also the tariff's callback data, so it is unique
+    amount: Mapped[int] = mapped_column(Integer, unique=True)
+    duration_days: Mapped[int] = mapped_column(Integer)
+    title: Mapped[str]
+    is_active: Mapped[bool] = mapped_column(Boolean, default=True)
+
 class PaymentStatus(enum.Enum):
     succeeded = "succeeded"
     pending = "pending"
 
 class Payment(Base):
     __tablename__ = 'payments'
+    __table_args__ = (
+        Index('uq_payments_yookassa_id', 'yookassa_id', unique=True),
+        Index('ix_payments_subscription_id', 'subscription_id'),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     yookassa_id: Mapped[str]
@@ -44,3 +75,142 @@ class Payment(Base):
     subscription_id: Mapped[int] = mapped_column(Integer, ForeignKey('subscriptions.id'))
     bot_message_id: Mapped[int | None] = mapped_column(BigInteger, nullable=True)
 
+class SubscriptionArchive(Base):
+    """
+    Expired subscriptions moved out of the hot table by the retention job.
+    """
+    __tablename__ = 'subscriptions_archive'
+    __table_args__ = (
+        Index('ix_subscriptions_archive_user_id', 'user_id'),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    user_id: Mapped[int] = mapped_column(BigInteger)
+    end_date: Mapped[datetime.datetime] = mapped_column(TIMESTAMP)
+    status: Mapped[SubscriptionStatus] = mapped_column(Enum(SubscriptionStatus))
+    amount_paid: Mapped[decimal.Decimal] = mapped_column(DECIMAL)
+    start_date: Mapped[datetime.datetime] = mapped_column(TIMESTAMP)
+    invite_link: Mapped[str | None]
+    last_warning_sent: Mapped[datetime.date | None] = mapped_column(Date)
+    archived_at: Mapped[datetime.datetime] = mapped_column(TIMESTAMP)
+
+class PaymentArchive(Base):
+    """
+    Payments of archived subscriptions.
+    """
+    __tablename__ = 'payments_archive'
+    __table_args__ = (
+        Index('ix_payments_archive_yookassa_id', 'yookassa_id'),
+        Index('ix_payments_archive_subscription_id', 'subscription_id'),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    yookassa_id: Mapped[str]
+    user_id: Mapped[int] = mapped_column(BigInteger)
+    status: Mapped[PaymentStatus] = mapped_column(Enum(PaymentStatus))
+    subscription_id: Mapped[int] = mapped_column(Integer)
+    bot_message_id: Mapped[int | None] = mapped_column(BigInteger, nullable=True)
+    archived_at: Mapped[datetime.datetime] = mapped_column(TIMESTAMP)
+
+class WebhookEventStatus(enum.Enum):
+    pending = "pending"
+    done = "done"
+    dead = "dead"
+
+class WebhookEvent(Base):
+    """
+    Durable inbox for incoming YooKassa notifications.
+    The HTTP handler only inserts rows here; WebhookInbox workers process them.
+    """
+    __tablename__ = 'webhook_events'
+    __table_args__ = (
+        # YooKassa redelivers the same notification until it gets a 200
+        UniqueConstraint('event', 'object_id', name='uq_webhook_events_event_object_id'),
+        Index('ix_webhook_events_pending', 'next_attempt_at', postgresql_where=text("status = 'pending'")),
+    )
+
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    event: Mapped[str]
+    object_id: Mapped[str]
+    payload: Mapped[dict] = mapped_column(JSONB)
+    status: Mapped[WebhookEventStatus] = mapped_column(Enum(WebhookEventStatus))
+    attempts: Mapped[int] = mapped_column(Integer, default=0)
+    next_attempt_at: Mapped[datetime.datetime] = mapped_column(TIMESTAMP)
+    last_error: Mapped[str | None]
+    created_at: Mapped[datetime.datetime] = mapped_column(TIMESTAMP)
+
+class OutboxStatus(enum.Enum):
+    pending = "pending"
+    done = "done"
+    dead = "dead"
+
+class OutboxMessage(Base):
+    """
+    Side effects (Telegram calls) recorded in the same transaction as the
+    change that causes them, and delivered later by OutboxDispatcher.
+    """
+    __tablename__ = 'outbox_messages'
+    __table_args__ = (
+        Index('ix_outbox_messages_pending', 'next_attempt_at', postgresql_where=text("status = 'pending'")),
+        # Per-user ordering: a message waits for the user's older pending ones
+        Index('ix_outbox_messages_pending_user', 'user_id', 'id', postgresql_where=text("status = 'pending'")),
+    )
+
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    user_id: Mapped[int] = mapped_column(BigInteger)
+    kind: Mapped[str]
+    payload: Mapped[dict] = mapped_column(JSONB)
+    status: Mapped[OutboxStatus] = mapped_column(Enum(OutboxStatus))
+    attempts: Mapped[int] = mapped_column(Integer, default=0)
+    next_attempt_at: Mapped[datetime.datetime] = mapped_column(TIMESTAMP)
+    last_error: Mapped[str | None]
+    created_at: Mapped[datetime.datetime] = mapped_column(TIMESTAMP)
+
+class SchedulerReplica(Base):
+    """
+    Heartbeats of running bot replicas; used to split scheduler shards between them.
+    """
+    __tablename__ = 'scheduler_replicas'
+
+    replica_id: Mapped[str] = mapped_column(primary_key=True)
+    heartbeat_at: Mapped[datetime.datetime] = mapped_column(TIMESTAMP)
+
+class SchedulerShardRun(Base):
+    """
+    When each shard of a scheduler job last completed.
+    """
+    __tablename__ = 'scheduler_shard_runs'
+
+    job_name: Mapped[str] = mapped_column(primary_key=True)
+    shard: Mapped[int] = mapped_column(Integer, primary_key=True)
+    finished_at: Mapped[datetime.datetime] = mapped_column(TIMESTAMP)
+    replica_id: Mapped[str]
+    # Where the job's next run picks up, for jobs that follow an external feed
+    high_water_mark: Mapped[datetime.datetime | None] = mapped_column(TIMESTAMP)
+
+class FsmState(Base):
+    """
+    aiogram FSM state and data, keyed by the storage key of the chat/user.
+    """
+    __tablename__ = 'fsm_states'
+
+    key: Mapped[str] = mapped_column(primary_key=True)
+    state: Mapped[str | None]
+    data: Mapped[dict] = mapped_column(JSONB)
+    updated_at: Mapped[datetime.datetime] = mapped_column(TIMESTAMP)
+
+class InviteLink(Base):
+    """
+    Pre-generated single-use invite links to the group, claimed after payments.
+    """
+    __tablename__ = 'invite_links'
+    __table_args__ = (
+        Index('ix_invite_links_available', 'expire_date', postgresql_where=text("claimed_at IS NULL")),
+    )
+
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    invite_link: Mapped[str] = mapped_column(unique=True)
+    expire_date: Mapped[datetime.datetime] = mapped_column(TIMESTAMP)
+    created_at: Mapped[datetime.datetime] = mapped_column(TIMESTAMP)
+    claimed_at: Mapped[datetime.datetime | None] = mapped_column(TIMESTAMP)
+    claimed_by: Mapped[int | None] = mapped_column(BigInteger)
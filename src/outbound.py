@@ -0,0 +1,210 @@
+import asyncio
+import logging
+import random
+from dataclasses import dataclass
+from typing import Any
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramRetryAfter, TelegramNetworkError, TelegramServerError
+from aiogram.methods import TelegramMethod, SendMessage, EditMessageText
+
+from src.config import (
+    OUTBOUND_RATE_LIMIT,
+    OUTBOUND_PER_CHAT_INTERVAL,
+    OUTBOUND_WORKERS,
+    OUTBOUND_MAX_RETRIES,
+    OUTBOUND_QUEUE_SIZE,
+)
+
+# Telegram limits how often a bot may post into the same chat,
+# other methods (bans, invite links) are only subject to the global limit.
+PER_CHAT_LIMITED_METHODS = (SendMessage, EditMessageText)
+TRANSIENT_ERRORS = (TelegramNetworkError, TelegramServerError)
+
+
+class TokenBucket:
+    """
+    Global rate limiter shared by all outbound workers.
+    """
+
+    def __init__(self, rate: float, capacity: float | None = None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self._tokens = self.capacity
+        self._updated_at = asyncio.get_running_loop().time()
+        self._paused_until = 0.0
+
+    def pause(self, seconds: float) -> None:
+        loop_time = asyncio.get_running_loop().time()
+        self._paused_until = max(self._paused_until, loop_time + seconds)
+
+    async def acquire(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            now = loop.time()
+            if now < self._paused_until:
+                await asyncio.sleep(self._paused_until - now)
+                continue
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+            self._updated_at = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+@dataclass
+class JobStats:
+    submitted: int = 0
+    sent: int = 0
+    failed: int = 0
+    retried: int = 0
+
+    def __str__(self) -> str:
+        return f"submitted={self.submitted} sent={self.sent} failed={self.failed} retried={self.retried}"
+
+
+@dataclass
+class _OutboundItem:
+    method: TelegramMethod
+    job: str
+    future: asyncio.Future
+    attempt: int = 0
+
+
+class OutboundDispatcher:
+    """
+    Queue plus worker pool for bulk Telegram calls.
+
+    Calls are throttled by a global token bucket and a per-chat interval,
+    TelegramRetryAfter pauses the whole dispatcher for the requested time,
+    and transient network/server errors are retried with backoff.
+    submit() returns a future with the call result, so callers can enqueue
+    a batch and await it together instead of sending one by one.
+    """
+
+    def __init__(
+        self,
+        bot: Bot,
+        rate: float = OUTBOUND_RATE_LIMIT,
+        per_chat_interval: float = OUTBOUND_PER_CHAT_INTERVAL,
+        workers: int = OUTBOUND_WORKERS,
+        max_retries: int = OUTBOUND_MAX_RETRIES,
+        queue_size: int = OUTBOUND_QUEUE_SIZE,
+    ):
+        self.bot = bot
+        self.rate = rate
+        self.per_chat_interval = per_chat_interval
+        self.workers = workers
+        self.max_retries = max_retries
+        self.stats: dict[str, JobStats] = {}
+        self._queue: asyncio.Queue[_OutboundItem] = asyncio.Queue(maxsize=queue_size)
+        self._chat_next_send: dict[Any, float] = {}
+        self._bucket: TokenBucket | None = None
+        self._tasks: list[asyncio.Task] = []
+
+    def start(self) -> None:
+        self._bucket = TokenBucket(self.rate)
+        for n in range(self.workers):
+            self._tasks.append(asyncio.create_task(self._worker(), name=f"outbound-{n}"))
+        logging.info(f"Outbound dispatcher started with {self.workers} workers at {self.rate} calls/s.")
+
+    async def stop(self, timeout: float = 0) -> None:
+        """
+        Sends what is still queued for up to `timeout` seconds, then cancels
+        the workers and the calls left over.
+        """
+        if timeout > 0 and self._tasks:
+            try:
+                await asyncio.wait_for(self.join(), timeout=timeout)
+            except asyncio.TimeoutError:
+                logging.warning(f"Outbound dispatcher stopped with {self.queue_depth} calls still queued.")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+        while not self._queue.empty():
+            self._queue.get_nowait().future.cancel()
+            self._queue.task_done()
+
+    async def join(self) -> None:
+        """
+        Waits until everything submitted so far has been sent or has failed.
+        """
+        await self._queue.join()
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    async def submit(self, method: TelegramMethod, job: str = "default") -> asyncio.Future:
+        """
+        Enqueues a Bot API call. Waits only if the queue is full.
+        """
+        future = asyncio.get_running_loop().create_future()
+        self.stats.setdefault(job, JobStats()).submitted += 1
+        await self._queue.put(_OutboundItem(method, job, future))
+        return future
+
+    async def _worker(self) -> None:
+        while True:
+            item = await self._queue.get()
+            try:
+                await self._send(item)
+            finally:
+                self._queue.task_done()
+
+    async def _wait_for_chat(self, method: TelegramMethod) -> None:
+        if not isinstance(method, PER_CHAT_LIMITED_METHODS):
+            return
+        loop = asyncio.get_running_loop()
+        chat_id = method.chat_id
+        while True:
+            now = loop.time()
+            next_send = self._chat_next_send.get(chat_id, 0.0)
+            if now >= next_send:
+                self._chat_next_send[chat_id] = now + self.per_chat_interval
+                break
+            await asyncio.sleep(next_send - now)
+
+        if len(self._chat_next_send) > 10000:
+            self._chat_next_send = {chat: t for chat, t in self._chat_next_send.items() if t > now}
+
+    async def _send(self, item: _OutboundItem) -> None:
+        stats = self.stats[item.job]
+        while not item.future.cancelled():
+            await self._wait_for_chat(item.method)
+            await self._bucket.acquire()
+            try:
+                result = await self.bot(item.method)
+            except TelegramRetryAfter as e:
+                # Flood control applies to the whole bot, so every worker backs off
+                logging.warning(f"Telegram asked to retry {item.method.__api_method__} after {e.retry_after}s")
+                self._bucket.pause(e.retry_after)
+                stats.retried += 1
+                continue
+            except TRANSIENT_ERRORS as e:
+                if item.attempt < self.max_retries:
+                    item.attempt += 1
+                    stats.retried += 1
+                    await asyncio.sleep(min(2 ** item.attempt, 30) + random.uniform(0, 0.5))
+                    continue
+                self._resolve(item, error=e)
+                stats.failed += 1
+                return
+            except Exception as e:
+                self._resolve(item, error=e)
+                stats.failed += 1
+                return
+            self._resolve(item, result=result)
+            stats.sent += 1
+            return
+
+    @staticmethod
+    def _resolve(item: _OutboundItem, result: Any = None, error: Exception | None = None) -> None:
+        if item.future.done():
+            return
+        if error is not None:
+            item.future.set_exception(error)
+        else:
+            item.future.set_result(result)
@@ -0,0 +1,183 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict
+
+from sqlalchemy import select, update, exists
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy.orm import aliased
+
+from src.config import OUTBOX_WORKERS, OUTBOX_MAX_ATTEMPTS, OUTBOX_POLL_INTERVAL
+from src.models import OutboxMessage, OutboxStatus
+
+# How long a claimed message stays invisible to other workers
+LEASE_DURATION = timedelta(seconds=60)
+RETRY_BASE_DELAY = 5
+RETRY_MAX_DELAY = 600
+
+OutboxHandler = Callable[[int, Dict[str, Any]], Awaitable[None]]
+
+
+def outbox_message(user_id: int, kind: str, payload: Dict[str, Any]):
+    """
+    INSERT for a new outbox message, to be executed in the transaction
+    that makes the change (or embedded in it as a CTE).
+    """
+    now = datetime.now()
+    return insert(OutboxMessage).values(
+        user_id=user_id,
+        kind=kind,
+        payload=payload,
+        status=OutboxStatus.pending,
+        attempts=0,
+        next_attempt_at=now,
+        created_at=now,
+    )
+
+
+class OutboxDispatcher:
+    """
+    Delivers outbox messages with a pool of workers.
+
+    Messages of different users are handled concurrently; a user's message
+    is only claimed once all of their older messages are done or dead, so
+    each user sees side effects in order. Failures are retried with
+    exponential backoff until the message is moved to the dead-letter state.
+    """
+
+    def __init__(
+        self,
+        async_session: async_sessionmaker,
+        handlers: Dict[str, OutboxHandler],
+        workers: int = OUTBOX_WORKERS,
+        max_attempts: int = OUTBOX_MAX_ATTEMPTS,
+        poll_interval: float = OUTBOX_POLL_INTERVAL,
+    ):
+        self.async_session = async_session
+        self.handlers = handlers
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.poll_interval = poll_interval
+        self._wakeup = asyncio.Event()
+        self._tasks: list[asyncio.Task] = []
+        self._stopping = False
+
+    def wakeup(self) -> None:
+        """
+        Tells idle workers that a message was just committed.
+        """
+        self._wakeup.set()
+
+    def start(self) -> None:
+        self._stopping = False
+        for n in range(self.workers):
+            self._tasks.append(asyncio.create_task(self._worker(n), name=f"outbox-{n}"))
+        logging.info(f"Outbox dispatcher started with {self.workers} workers.")
+
+    async def stop(self, timeout: float = 0) -> None:
+        """
+        Gives workers up to `timeout` seconds to deliver the message in hand
+        before cancelling them; an interrupted delivery is retried after its lease.
+        """
+        self._stopping = True
+        self._wakeup.set()
+        if self._tasks and timeout > 0:
+            await asyncio.wait(self._tasks, timeout=timeout)
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+
+    async def _worker(self, n: int) -> None:
+        while not self._stopping:
+            try:
+                message = await self._claim()
+            except Exception as e:
+                logging.error(f"Outbox worker {n} could not claim a message: {e}")
+                message = None
+
+            if message is None:
+                if self._stopping:
+                    break
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            try:
+                await self._process(message)
+            except Exception as e:
+                # The lease expires and the message is picked up again
+                logging.error(f"Outbox worker {n} could not record the result of message {message.id}: {e}")
+
+    async def _process(self, message: OutboxMessage) -> None:
+        try:
+            handler = self.handlers[message.kind]
+            await handler(message.user_id, message.payload)
+        except Exception as e:
+            logging.error(f"Outbox message {message.id} ({message.kind} for user {message.user_id}) failed on attempt {message.attempts}: {e}")
+            await self._fail(message, e)
+        else:
+            await self._set_status(message.id, OutboxStatus.done)
+            # The user's next message may have been waiting for this one
+            self._wakeup.set()
+
+    async def _claim(self) -> OutboxMessage | None:
+        """
+        Claims the oldest due message whose user has no older pending message.
+        """
+        now = datetime.now()
+        older = aliased(OutboxMessage)
+        async with self.async_session() as session:
+            due_message = (
+                select(OutboxMessage.id)
+                .where(
+                    OutboxMessage.status == OutboxStatus.pending,
+                    OutboxMessage.next_attempt_at <= now,
+                    ~exists().where(
+                        older.user_id == OutboxMessage.user_id,
+                        older.status == OutboxStatus.pending,
+                        older.id < OutboxMessage.id,
+                    ),
+                )
+                .order_by(OutboxMessage.next_attempt_at)
+                .limit(1)
+                .with_for_update(skip_locked=True)
+                .scalar_subquery()
+            )
+            result = await session.execute(
+                update(OutboxMessage)
+                .where(OutboxMessage.id == due_message)
+                .values(attempts=OutboxMessage.attempts + 1, next_attempt_at=now + LEASE_DURATION)
+                .returning(OutboxMessage)
+            )
+            message = result.scalar_one_or_none()
+            await session.commit()
+            return message
+
+    async def _fail(self, message: OutboxMessage, error: Exception) -> None:
+        if message.attempts >= self.max_attempts:
+            logging.error(f"Outbox message {message.id} moved to dead-letter after {message.attempts} attempts.")
+            await self._set_status(message.id, OutboxStatus.dead, error)
+            self._wakeup.set()
+            return
+
+        delay = min(RETRY_BASE_DELAY * 2 ** (message.attempts - 1), RETRY_MAX_DELAY)
+        async with self.async_session() as session:
+            await session.execute(
+                update(OutboxMessage)
+                .where(OutboxMessage.id == message.id)
+                .values(next_attempt_at=datetime.now() + timedelta(seconds=delay), last_error=str(error))
+            )
+            await session.commit()
+
+    async def _set_status(self, message_id: int, status: OutboxStatus, error: Exception | None = None) -> None:
+        values = {"status": status}
+        if error is not None:
+            values["last_error"] = str(error)
+        async with self.async_session() as session:
+            await session.execute(update(OutboxMessage).where(OutboxMessage.id == message_id).values(**values))
+            await session.commit()
@@ -0,0 +1,61 @@
+import asyncio
+import math
+import time
+from collections import OrderedDict
+
+from src.config import PAYMENT_STATUS_CACHE_TTL, PAYMENT_STATUS_CACHE_SIZE
+from src.metrics import CACHE_LOOKUPS, CACHE_ENTRIES
+from src.yookassa_client import YooKassaClient
+
+# Statuses a YooKassa payment never leaves
+TERMINAL_STATUSES = {"succeeded", "canceled"}
+
+
+class PaymentStatusCache:
+    """
+    YooKassa payment statuses as seen by the "check payment" button.
+
+    Concurrent lookups of the same payment share one in-flight request, and
+    the answer is kept for a few seconds, so users pressing the button over
+    and over cost one API call per TTL. Terminal statuses are kept until
+    evicted by size. Failed lookups are not cached.
+    """
+
+    def __init__(self, ttl: float = PAYMENT_STATUS_CACHE_TTL, max_size: int = PAYMENT_STATUS_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries: OrderedDict[str, tuple[float, str]] = OrderedDict()
+        self._in_flight: dict[str, asyncio.Task] = {}
+        self._hits = CACHE_LOOKUPS.labels("payment_status", "hit")
+        self._misses = CACHE_LOOKUPS.labels("payment_status", "miss")
+        CACHE_ENTRIES.labels("payment_status").set_function(lambda: len(self._entries))
+
+    async def get_status(self, yookassa: YooKassaClient, yookassa_payment_id: str) -> str | None:
+        entry = self._entries.get(yookassa_payment_id)
+        if entry is not None and entry[0] > time.monotonic():
+            self._entries.move_to_end(yookassa_payment_id)
+            self._hits.inc()
+            return entry[1]
+
+        task = self._in_flight.get(yookassa_payment_id)
+        if task is None:
+            self._misses.inc()
+            task = asyncio.create_task(self._fetch(yookassa, yookassa_payment_id))
+            self._in_flight[yookassa_payment_id] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(yookassa_payment_id, None))
+        else:
+            self._hits.inc()
+        # A caller that gives up must not cancel the lookup for everyone else
+        return await asyncio.shield(task)
+
+    async def _fetch(self, yookassa: YooKassaClient, yookassa_payment_id: str) -> str | None:
+        status = (await yookassa.find_payment(yookassa_payment_id)).get("status")
+        expires_at = math.inf if status in TERMINAL_STATUSES else time.monotonic() + self.ttl
+        self._entries[yookassa_payment_id] = (expires_at, status)
+        self._entries.move_to_end(yookassa_payment_id)
+        if len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+        return status
+
+
+payment_status_cache = PaymentStatusCache()
@@ -0,0 +1,105 @@
+import logging
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, update, func
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from src.activation import activate_payment
+from src.config import RECONCILIATION_MAX_AGE_HOURS, RECONCILIATION_PAGE_SIZE
+from src.metrics import SCHEDULER_JOB_DURATION, SCHEDULER_ROWS_PROCESSED
+from src.models import Payment, PaymentStatus, SchedulerShardRun, Subscription
+from src.outbox import OutboxDispatcher
+from src.yookassa_client import YooKassaClient
+
+# Slack for the difference between our clock and YooKassa's created_at
+CLOCK_SKEW_MARGIN = timedelta(minutes=5)
+# Scheduler job name; its scheduler_shard_runs row keeps the high-water mark
+RECONCILIATION_JOB = "payment_reconciliation"
+
+
+def _local_time(timestamp: str) -> datetime:
+    # YooKassa reports UTC; the bot stores naive local time
+    return datetime.fromisoformat(timestamp).astimezone().replace(tzinfo=None)
+
+
+async def reconcile_payments(
+    async_session: async_sessionmaker,
+    yookassa: YooKassaClient,
+    outbox: OutboxDispatcher,
+    max_age: timedelta = timedelta(hours=RECONCILIATION_MAX_AGE_HOURS),
+    page_size: int = RECONCILIATION_PAGE_SIZE,
+    job_name: str = RECONCILIATION_JOB,
+) -> int:
+    """
+    Activates pending payments that succeeded without their webhook arriving.
+
+    Pending payments created within `max_age` are loaded in one query, then
+    the succeeded payments YooKassa created since the oldest of them are
+    paged through with the list API and matched in memory. Matches go
+    through activate_payment like a webhook would, so a notification that
+    arrives later changes nothing. Returns the number of activations.
+
+    Once a sweep completes, the newest captured_at it saw is stored as the
+    job's high-water mark, and the next sweep only lists payments captured
+    since then. Abandoned checkouts keep the created_at window days wide,
+    so without the mark every run would re-list days of payments. The mark
+    is on captured_at rather than created_at because a checkout created
+    before the last sweep can still be paid after it. Until the job has a
+    scheduler_shard_runs row, i.e. on its very first run, the whole
+    created_at window is listed.
+    """
+    started = time.perf_counter()
+    async with async_session() as session:
+        # The pending subscription is created together with its payment
+        pending = dict((await session.execute(
+            select(Payment.yookassa_id, Subscription.start_date)
+            .join(Subscription, Subscription.id == Payment.subscription_id)
+            .where(Payment.status == PaymentStatus.pending, Subscription.start_date > func.now() - max_age)
+        )).all())
+        high_water_mark = (await session.execute(
+            select(SchedulerShardRun.high_water_mark).where(SchedulerShardRun.job_name == job_name, SchedulerShardRun.shard == 0)
+        )).scalar_one_or_none()
+
+    matched = []
+    scanned = 0
+    newest_capture = None
+    if pending:
+        created_after = min(pending.values()) - CLOCK_SKEW_MARGIN
+        captured_after = high_water_mark - CLOCK_SKEW_MARGIN if high_water_mark else None
+        async for payment in yookassa.iter_payments(
+            status="succeeded", created_after=created_after, captured_after=captured_after, limit=page_size
+        ):
+            scanned += 1
+            if payment.get("captured_at"):
+                captured_at = _local_time(payment["captured_at"])
+                newest_capture = max(newest_capture or captured_at, captured_at)
+            if payment["id"] in pending:
+                matched.append(payment["id"])
+
+    activated = 0
+    for yookassa_payment_id in matched:
+        activation = await activate_payment(async_session, yookassa_payment_id)
+        if activation is not None and activation.activated:
+            logging.warning(f"Reconciliation activated payment {activation.payment_id} (yookassa_id {yookassa_payment_id}) whose webhook was missed.")
+            activated += 1
+    if activated:
+        outbox.wakeup()
+
+    if newest_capture is not None and (high_water_mark is None or newest_capture > high_water_mark):
+        async with async_session() as session:
+            await session.execute(
+                update(SchedulerShardRun)
+                .where(SchedulerShardRun.job_name == job_name, SchedulerShardRun.shard == 0)
+                .values(high_water_mark=newest_capture)
+            )
+            await session.commit()
+
+    SCHEDULER_ROWS_PROCESSED.labels("payment_reconciliation", "activated").inc(activated)
+    SCHEDULER_JOB_DURATION.labels("payment_reconciliation").observe(time.perf_counter() - started)
+    logging.info(
+        f"Payment reconciliation: {len(pending)} pending, {scanned} succeeded in YooKassa "
+        f"since {high_water_mark or 'the oldest pending'}, "
+        f"{activated} activated in {time.perf_counter() - started:.2f}s"
+    )
+    return activated
@@ -0,0 +1,224 @@
+import logging
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, insert, delete, func, exists, literal, TIMESTAMP
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy.orm import aliased
+
+from src.config import (
+    RETENTION_PENDING_TTL_HOURS,
+    RETENTION_ARCHIVE_AFTER_DAYS,
+    RETENTION_QUEUE_TTL_DAYS,
+    RETENTION_BATCH_SIZE,
+)
+from src.metrics import SCHEDULER_JOB_DURATION, SCHEDULER_ROWS_PROCESSED
+from src.models import (
+    OutboxMessage,
+    OutboxStatus,
+    Payment,
+    PaymentArchive,
+    PaymentStatus,
+    Subscription,
+    SubscriptionArchive,
+    SubscriptionStatus,
+    WebhookEvent,
+    WebhookEventStatus,
+)
+
+# Archived columns, in the order of the archive tables' INSERT
+SUBSCRIPTION_COLUMNS = ["id", "user_id", "end_date", "status", "amount_paid", "start_date", "invite_link", "last_warning_sent"]
+PAYMENT_COLUMNS = ["id", "yookassa_id", "user_id", "status", "subscription_id", "bot_message_id"]
+
+
+def _count(cte):
+    return select(func.count()).select_from(cte).scalar_subquery()
+
+
+async def purge_abandoned_checkouts(
+    async_session: async_sessionmaker,
+    ttl: timedelta = timedelta(hours=RETENTION_PENDING_TTL_HOURS),
+    batch_size: int = RETENTION_BATCH_SIZE,
+) -> int:
+    """
+    Deletes checkouts (pending subscriptions and their pending payments)
+    older than `ttl`, one batch per transaction.
+
+    Rows are locked with SKIP LOCKED in the order activate_payment locks
+    them, payment first, so a checkout that is being paid right now is left
+    alone. Checkouts whose YooKassa payment was never created have no
+    payment row and are purged on their own. Returns the subscriptions deleted.
+    """
+    cutoff = datetime.now() - ttl
+    total = 0
+    while True:
+        async with async_session() as session:
+            batch = (
+                select(Payment.id.label("payment_id"), Subscription.id.label("subscription_id"))
+                .join(Subscription, Subscription.id == Payment.subscription_id)
+                .where(
+                    Payment.status == PaymentStatus.pending,
+                    Subscription.status == SubscriptionStatus.pending,
+                    Subscription.start_date < cutoff,
+                )
+                # Ids grow with time, so old checkouts come first in primary key order
+                .order_by(Subscription.id)
+                .limit(batch_size)
+                .with_for_update(of=[Payment, Subscription], skip_locked=True)
+                .cte("batch")
+            )
+            deleted_payments = (
+                delete(Payment)
+                .where(Payment.id.in_(select(batch.c.payment_id)))
+                .returning(Payment.id)
+                .cte("deleted_payments")
+            )
+            deleted_subscriptions = (
+                delete(Subscription)
+                .where(Subscription.id.in_(select(batch.c.subscription_id)))
+                .returning(Subscription.id)
+                .cte("deleted_subscriptions")
+            )
+            orphans = (
+                select(Subscription.id)
+                .where(
+                    Subscription.status == SubscriptionStatus.pending,
+                    Subscription.start_date < cutoff,
+                    ~exists().where(Payment.subscription_id == Subscription.id),
+                )
+                .order_by(Subscription.id)
+                .limit(batch_size)
+                .with_for_update(skip_locked=True)
+                .cte("orphans")
+            )
+            deleted_orphans = (
+                delete(Subscription)
+                .where(Subscription.id.in_(select(orphans.c.id)))
+                .returning(Subscription.id)
+                .cte("deleted_orphans")
+            )
+            counts = (await session.execute(select(
+                _count(deleted_payments).label("payments"),
+                _count(deleted_subscriptions).label("subscriptions"),
+                _count(deleted_orphans).label("orphans"),
+            ))).one()
+            await session.commit()
+
+        total += counts.subscriptions + counts.orphans
+        if counts.subscriptions < batch_size and counts.orphans < batch_size:
+            return total
+
+
+async def archive_expired_subscriptions(
+    async_session: async_sessionmaker,
+    older_than: timedelta = timedelta(days=RETENTION_ARCHIVE_AFTER_DAYS),
+    batch_size: int = RETENTION_BATCH_SIZE,
+) -> int:
+    """
+    Moves subscriptions that expired more than `older_than` ago, together
+    with their payments, into the archive tables. Each batch is one
+    DELETE ... RETURNING / INSERT statement, so rows are never lost or
+    duplicated. Returns the subscriptions archived.
+    """
+    cutoff = datetime.now() - older_than
+    total = 0
+    while True:
+        async with async_session() as session:
+            now = datetime.now()
+            batch = (
+                select(Subscription.id)
+                .where(Subscription.status == SubscriptionStatus.expired, Subscription.end_date < cutoff)
+                .order_by(Subscription.id)
+                .limit(batch_size)
+                .with_for_update(skip_locked=True)
+                .cte("batch")
+            )
+            moved_payments = (
+                delete(Payment)
+                .where(Payment.subscription_id.in_(select(batch.c.id)))
+                .returning(*(getattr(Payment, column) for column in PAYMENT_COLUMNS))
+                .cte("moved_payments")
+            )
+            moved_subscriptions = (
+                delete(Subscription)
+                .where(Subscription.id.in_(select(batch.c.id)))
+                .returning(*(getattr(Subscription, column) for column in SUBSCRIPTION_COLUMNS))
+                .cte("moved_subscriptions")
+            )
+            archived_payments = (
+                insert(PaymentArchive)
+                .from_select(
+                    PAYMENT_COLUMNS + ["archived_at"],
+                    select(*(moved_payments.c[column] for column in PAYMENT_COLUMNS), literal(now, TIMESTAMP)),
+                )
+                .returning(PaymentArchive.id)
+                .cte("archived_payments")
+            )
+            archived_subscriptions = (
+                insert(SubscriptionArchive)
+                .from_select(
+                    SUBSCRIPTION_COLUMNS + ["archived_at"],
+                    select(*(moved_subscriptions.c[column] for column in SUBSCRIPTION_COLUMNS), literal(now, TIMESTAMP)),
+                )
+                .returning(SubscriptionArchive.id)
+                .cte("archived_subscriptions")
+            )
+            counts = (await session.execute(select(
+                _count(archived_payments).label("payments"),
+                _count(archived_subscriptions).label("subscriptions"),
+            ))).one()
+            await session.commit()
+
+        total += counts.subscriptions
+        if counts.subscriptions < batch_size:
+            return total
+
+
+async def purge_processed_queue_rows(
+    async_session: async_sessionmaker,
+    ttl: timedelta = timedelta(days=RETENTION_QUEUE_TTL_DAYS),
+    batch_size: int = RETENTION_BATCH_SIZE,
+) -> int:
+    """
+    Deletes delivered webhook_events and outbox_messages older than `ttl`.
+    Dead-lettered rows are kept for investigation.
+    """
+    cutoff = datetime.now() - ttl
+    total = 0
+    for model, done in ((WebhookEvent, WebhookEventStatus.done), (OutboxMessage, OutboxStatus.done)):
+        while True:
+            async with async_session() as session:
+                # Aliased so the subquery is not correlated with the DELETE
+                old = aliased(model)
+                batch = (
+                    select(old.id)
+                    .where(old.status == done, old.created_at < cutoff)
+                    .order_by(old.id)
+                    .limit(batch_size)
+                    .with_for_update(skip_locked=True)
+                )
+                deleted = (await session.execute(delete(model).where(model.id.in_(batch)))).rowcount
+                await session.commit()
+            total += deleted
+            if deleted < batch_size:
+                break
+    return total
+
+
+async def run_retention(async_session: async_sessionmaker) -> None:
+    """
+    Scheduler job: keeps the tables the bot works on small as history grows.
+    """
+    started = time.perf_counter()
+    purged = await purge_abandoned_checkouts(async_session)
+    archived = await archive_expired_subscriptions(async_session)
+    queue_rows = await purge_processed_queue_rows(async_session)
+
+    SCHEDULER_ROWS_PROCESSED.labels("retention", "purged_checkouts").inc(purged)
+    SCHEDULER_ROWS_PROCESSED.labels("retention", "archived_subscriptions").inc(archived)
+    SCHEDULER_ROWS_PROCESSED.labels("retention", "purged_queue_rows").inc(queue_rows)
+    SCHEDULER_JOB_DURATION.labels("retention").observe(time.perf_counter() - started)
+    logging.info(
+        f"Retention: purged {purged} abandoned checkouts, archived {archived} expired subscriptions, "
+        f"deleted {queue_rows} processed queue rows in {time.perf_counter() - started:.2f}s"
+    )
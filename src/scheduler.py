@@ -1,86 +1,242 @@
+import asyncio
 import logging
-from aiogram import Bot
+import time
+from collections import Counter
+from aiogram.methods import BanChatMember, SendMessage
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton # Added import
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
-from datetime import datetime, timedelta, date
+from sqlalchemy import select, update, any_, bindparam, tuple_, case, cast, literal, or_, Date, Integer
+from sqlalchemy.dialects.postgresql import ARRAY
+from datetime import datetime, timedelta, date, time as dt_time
 
 from src.models import Subscription, SubscriptionStatus
-from src.config import GROUP_ID
+from src.config import GROUP_ID, EXPIRATION_SWEEP_BATCH_SIZE
 from src.lexicon import lexicon
+from src.outbound import OutboundDispatcher
+from src.subscription_cache import subscription_cache, invalidation_notice
+from src.coordination import Shard
+from src.metrics import SCHEDULER_JOB_DURATION, SCHEDULER_ROWS_PROCESSED
 
-async def check_expired_subscriptions(bot: Bot, async_session: AsyncSession):
+# Lexicon keys of the warning sent for each "days left" bucket
+WARNING_TEMPLATES = {
+    0: 'subscription.expired_warning_0_days',
+    3: 'subscription.expires_in_3_days',
+    7: 'subscription.expires_in_7_days',
+    14: 'subscription.expires_in_14_days',
+}
+
+async def check_expired_subscriptions(
+    outbound: OutboundDispatcher,
+    async_session: AsyncSession,
+    shard: Shard | None = None,
+    batch_size: int = EXPIRATION_SWEEP_BATCH_SIZE,
+):
     """
     Checks for subscriptions that expired more than 5 days ago, 
     removes users from the group, and updates their status.
+
+    Subscriptions are read in keyset-paginated chunks, bans and notifications
+    go through the outbound dispatcher, and each chunk's statuses are flipped
+    with a single UPDATE. With a shard, only that shard's users are swept.
     """
-    async with async_session() as session:
-        five_days_ago = datetime.now() - timedelta(days=5)
-        expired_subscriptions = await session.execute(
-            select(Subscription).where(
+    five_days_ago = datetime.now() - timedelta(days=5)
+    # Scheduled messages have no incoming update to take the language from
+    texts = lexicon.texts()
+    last_row = None
+    chunk_number = 0
+    total_seen = 0
+    total_expired = 0
+    sweep_started = time.perf_counter()
+
+    while True:
+        chunk_started = time.perf_counter()
+        query = (
+            select(Subscription.id, Subscription.user_id, Subscription.end_date).where(
                 Subscription.end_date < five_days_ago,
                 Subscription.status == SubscriptionStatus.active
             )
+            .order_by(Subscription.end_date, Subscription.id)
+            .limit(batch_size)
         )
-        
-        for sub_tuple in expired_subscriptions:
-            subscription = sub_tuple[0]
-            try:
-                # Kick user from the group
-                await bot.ban_chat_member(chat_id=int(GROUP_ID), user_id=subscription.user_id)
-                
-                # Update subscription status
-                subscription.status = SubscriptionStatus.expired
+        if shard is not None:
+            query = query.where(shard.where(Subscription.user_id))
+        if last_row is not None:
+            # Keyset pagination: continue right after the last row of the previous chunk
+            query = query.where(tuple_(Subscription.end_date, Subscription.id) > (last_row.end_date, last_row.id))
+        async with async_session() as session:
+            chunk = (await session.execute(query)).all()
+
+        if not chunk:
+            break
+        chunk_number += 1
+        last_row = chunk[-1]
+
+        # Kick users from the group
+        ban_results = await asyncio.gather(*[
+            await outbound.submit(BanChatMember(chat_id=int(GROUP_ID), user_id=row.user_id), job="expiration_sweep")
+            for row in chunk
+        ], return_exceptions=True)
+        expired = []
+        for row, result in zip(chunk, ban_results):
+            # A ban cancelled by a shutdown comes back as CancelledError, which is not an Exception
+            if isinstance(result, BaseException):
+                # Log the error, e.g., if the bot can't ban a user (admin) or user not found
+                logging.error(f"Could not process expired subscription for user {row.user_id}: {result}")
+            else:
+                expired.append(row)
+
+        if expired:
+            # Update subscription statuses for the whole chunk at once
+            async with async_session() as session:
+                await session.execute(
+                    update(Subscription)
+                    .where(Subscription.id == any_(bindparam("expired_ids", [row.id for row in expired], type_=ARRAY(Integer))))
+                    .values(status=SubscriptionStatus.expired)
+                    .execution_options(synchronize_session=False)
+                )
+                await session.execute(invalidation_notice(row.user_id for row in expired))
                 await session.commit()
-                
-                # Notify user
-                await bot.send_message(
-                    chat_id=subscription.user_id,
-                    text=lexicon['subscription']['expired_warning_5_days_ago']
+            subscription_cache.invalidate_many(row.user_id for row in expired)
+
+            # Notify users
+            notify_results = await asyncio.gather(*[
+                await outbound.submit(
+                    SendMessage(chat_id=row.user_id, text=texts('subscription.expired_warning_5_days_ago')),
+                    job="expiration_sweep"
                 )
-            except Exception as e:
-                # Log the error, e.g., if the bot can't ban a user (admin) or user not found
-                logging.error(f"Could not process expired subscription for user {subscription.user_id}: {e}")
+                for row in expired
+            ], return_exceptions=True)
+            for row, result in zip(expired, notify_results):
+                if isinstance(result, BaseException):
+                    logging.error(f"Could not notify user {row.user_id} about expired subscription: {result}")
+
+        total_seen += len(chunk)
+        total_expired += len(expired)
+        SCHEDULER_ROWS_PROCESSED.labels("expiration_sweep", "expired").inc(len(expired))
+        SCHEDULER_ROWS_PROCESSED.labels("expiration_sweep", "failed").inc(len(chunk) - len(expired))
+        logging.info(
+            f"Expiration sweep chunk {chunk_number}: {len(expired)}/{len(chunk)} subscriptions expired "
+            f"in {time.perf_counter() - chunk_started:.2f}s (last id {last_row.id})"
+        )
+
+    SCHEDULER_JOB_DURATION.labels("expiration_sweep").observe(time.perf_counter() - sweep_started)
+    logging.info(
+        f"Expiration sweep finished: {total_expired}/{total_seen} subscriptions expired "
+        f"in {chunk_number} chunks, {time.perf_counter() - sweep_started:.2f}s "
+        f"(outbound: {outbound.stats.get('expiration_sweep')})"
+    )
+
+async def _mark_warned(async_session: AsyncSession, pending_warnings: list, today: date) -> None:
+    results = await asyncio.gather(*(future for _, _, future in pending_warnings), return_exceptions=True)
+    warned_ids = []
+    for (subscription_id, user_id, _), result in zip(pending_warnings, results):
+        # Cancelled sends (CancelledError) were never delivered either
+        if isinstance(result, BaseException):
+            logging.error(f"Could not send warning to user {user_id}: {result}")
+        else:
+            warned_ids.append(subscription_id)
+    SCHEDULER_ROWS_PROCESSED.labels("expiration_warnings", "warned").inc(len(warned_ids))
+    SCHEDULER_ROWS_PROCESSED.labels("expiration_warnings", "failed").inc(len(pending_warnings) - len(warned_ids))
+
+    if warned_ids:
+        async with async_session() as session:
+            await session.execute(
+                update(Subscription)
+                .where(Subscription.id == any_(bindparam("warned_ids", warned_ids, type_=ARRAY(Integer))))
+                .values(last_warning_sent=today)
+                .execution_options(synchronize_session=False)
+            )
+            await session.commit()
 
-async def send_expiration_warnings(bot: Bot, async_session: AsyncSession):
+def expiration_warnings_query(today: date, shard: Shard | None = None, after=None):
     """
-    Sends warnings to users whose subscriptions are about to expire.
+    Active subscriptions that are due a warning today, with their "days left" bucket.
+    With `after` (a row of the previous page), continues right after it.
+
+    Rows are ordered by (end_date, id), the key of ix_subscriptions_active_expiry,
+    so every page is an index range scan. days_left and bucket only grow with
+    end_date, so the rows still come grouped by bucket.
     """
-    async with async_session() as session:
-        active_subscriptions = await session.execute(
-            select(Subscription).where(Subscription.status == SubscriptionStatus.active)
+    days_left = (cast(Subscription.end_date, Date) - literal(today, Date)).label("days_left")
+    bucket = case(
+        (days_left <= 0, 0),
+        (days_left <= 3, 3),
+        (days_left <= 7, 7),
+        else_=14,
+    ).label("bucket")
+    query = (
+        select(Subscription.id, Subscription.user_id, Subscription.end_date, days_left, bucket)
+        .where(
+            Subscription.status == SubscriptionStatus.active,
+            Subscription.end_date < datetime.combine(today + timedelta(days=15), dt_time.min),
+            or_(Subscription.last_warning_sent.is_(None), Subscription.last_warning_sent != today)
         )
-        
-        today = date.today()
-        
-        for sub_tuple in active_subscriptions:
-            subscription = sub_tuple[0]
-            days_left = (subscription.end_date.date() - today).days
-            
-            warning_sent_today = subscription.last_warning_sent == today
-            
-            if warning_sent_today:
-                continue
-
-            message = None
-            if days_left <= 0:
-                message = lexicon['subscription']['expired_warning_0_days']
-            elif days_left <= 3:
-                message = lexicon['subscription']['expires_in_3_days'].format(days_left=days_left)
-            elif days_left <= 7:
-                message = lexicon['subscription']['expires_in_7_days']
-            elif days_left <= 14:
-                message = lexicon['subscription']['expires_in_14_days']
-
-            if message:
-                renew_keyboard = InlineKeyboardMarkup(
-                    inline_keyboard=[
-                        [InlineKeyboardButton(text=lexicon['buttons']['renew_from_warning'], callback_data="renew_subscription_from_warning")]
-                    ]
-                )
-                try:
-                    await bot.send_message(chat_id=subscription.user_id, text=message, reply_markup=renew_keyboard)
-                    subscription.last_warning_sent = today
-                    await session.commit()
-                except Exception as e:
-                    logging.error(f"Could not send warning to user {subscription.user_id}: {e}")
+        .order_by(Subscription.end_date, Subscription.id)
+    )
+    if shard is not None:
+        query = query.where(shard.where(Subscription.user_id))
+    if after is not None:
+        # Keyset pagination: rows whose warning failed still match the filter, so paging must not restart from the top
+        query = query.where(tuple_(Subscription.end_date, Subscription.id) > (after.end_date, after.id))
+    return query
+
+async def send_expiration_warnings(
+    outbound: OutboundDispatcher,
+    async_session: AsyncSession,
+    shard: Shard | None = None,
+    batch_size: int = EXPIRATION_SWEEP_BATCH_SIZE,
+):
+    """
+    Sends warnings to users whose subscriptions are about to expire.
+
+    The database picks the 0/3/7/14-day bucket and skips subscriptions that
+    were already warned today, so only rows that need a message come back,
+    grouped by bucket; each template is formatted once.
+
+    Rows are read in keyset-paginated pages, each in its own short session
+    that is closed before the page's sends are awaited, so no transaction or
+    connection is held while the outbound dispatcher works through them.
+    """
+    started = time.perf_counter()
+    today = date.today()
+    texts = lexicon.texts()
+
+    renew_keyboard = InlineKeyboardMarkup(
+        inline_keyboard=[
+            [InlineKeyboardButton(text=texts('buttons.renew_from_warning'), callback_data="renew_subscription_from_warning")]
+        ]
+    )
+    messages = {}
+    bucket_counts = Counter()
+    last_row = None
+
+    while True:
+        async with async_session() as session:
+            page = (await session.execute(expiration_warnings_query(today, shard, last_row).limit(batch_size))).all()
+        if not page:
+            break
+        last_row = page[-1]
+
+        pending_warnings = []
+        for row in page:
+            # Only the 3-day template depends on the row, the rest are formatted once per bucket
+            message_key = (row.bucket, row.days_left) if row.bucket == 3 else row.bucket
+            if message_key not in messages:
+                messages[message_key] = texts(WARNING_TEMPLATES[row.bucket], days_left=row.days_left)
+
+            future = await outbound.submit(
+                SendMessage(chat_id=row.user_id, text=messages[message_key], reply_markup=renew_keyboard),
+                job="expiration_warnings"
+            )
+            pending_warnings.append((row.id, row.user_id, future))
+            bucket_counts[row.bucket] += 1
+        await _mark_warned(async_session, pending_warnings, today)
+
+        if len(page) < batch_size:
+            break
+
+    SCHEDULER_JOB_DURATION.labels("expiration_warnings").observe(time.perf_counter() - started)
+    logging.info(
+        f"Expiration warnings by bucket {dict(sorted(bucket_counts.items()))}: "
+        f"{outbound.stats.get('expiration_warnings')}"
+    )
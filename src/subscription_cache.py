@@ -0,0 +1,150 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Iterable
+
+from sqlalchemy import select, func, bindparam, cast, BigInteger, Text
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker
+
+from src.config import SUBSCRIPTION_CACHE_TTL, SUBSCRIPTION_CACHE_SIZE
+from src.metrics import CACHE_LOOKUPS, CACHE_ENTRIES
+from src.models import Subscription, SubscriptionStatus
+
+# Postgres NOTIFY channel that carries the user_ids of changed subscriptions to every replica
+INVALIDATION_CHANNEL = "subscription_changed"
+LISTEN_RETRY_DELAY = 5
+
+
+def invalidation_notice(user_ids: Iterable[int]):
+    """
+    Statement that, executed in the transaction changing these users'
+    subscriptions, tells every replica's cache to drop them on commit.
+    """
+    user_id = func.unnest(bindparam("invalidated_user_ids", list(user_ids), type_=ARRAY(BigInteger))).column_valued("user_id")
+    return select(func.pg_notify(INVALIDATION_CHANNEL, cast(user_id, Text)))
+
+
+@dataclass(frozen=True)
+class SubscriptionSnapshot:
+    """
+    What the menus need to know about a user's current subscription.
+    """
+    end_date: datetime | None = None
+    status: SubscriptionStatus | None = None
+
+    @property
+    def is_active(self) -> bool:
+        return self.status == SubscriptionStatus.active and self.end_date is not None and self.end_date > datetime.now()
+
+
+class SubscriptionCache:
+    """
+    Per-user cache of the newest active subscription, bounded by TTL and size.
+
+    Every code path that changes a subscription's status must execute
+    invalidation_notice() in its transaction and call invalidate() after
+    committing. The local call makes the change visible on this replica
+    right away; the notice reaches the other replicas through a LISTEN
+    connection held by start(), so a payment activated by one replica is
+    not shown as inactive by another. Whenever that connection is
+    (re)established the whole cache is dropped, since notices sent while
+    it was down are lost; the TTL only bounds staleness if Postgres
+    delivers nothing at all.
+    """
+
+    def __init__(self, ttl: float = SUBSCRIPTION_CACHE_TTL, max_size: int = SUBSCRIPTION_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries: OrderedDict[int, tuple[float, SubscriptionSnapshot]] = OrderedDict()
+        # Bumped on every invalidation; a load that overlaps one is not cached
+        self._invalidations = 0
+        self._listen_task: asyncio.Task | None = None
+        self._hits = CACHE_LOOKUPS.labels("subscriptions", "hit")
+        self._misses = CACHE_LOOKUPS.labels("subscriptions", "miss")
+        CACHE_ENTRIES.labels("subscriptions").set_function(lambda: len(self._entries))
+
+    async def get(self, async_session: async_sessionmaker, user_id: int) -> SubscriptionSnapshot:
+        entry = self._entries.get(user_id)
+        if entry is not None and entry[0] > time.monotonic():
+            self._entries.move_to_end(user_id)
+            self._hits.inc()
+            return entry[1]
+
+        self._misses.inc()
+        invalidations = self._invalidations
+        async with async_session() as session:
+            row = (await session.execute(
+                select(Subscription.end_date, Subscription.status)
+                .filter_by(user_id=user_id, status=SubscriptionStatus.active)
+                .order_by(Subscription.end_date.desc())
+                .limit(1)
+            )).first()
+        snapshot = SubscriptionSnapshot(row.end_date, row.status) if row else SubscriptionSnapshot()
+
+        if invalidations == self._invalidations:
+            self._entries[user_id] = (time.monotonic() + self.ttl, snapshot)
+            self._entries.move_to_end(user_id)
+            if len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return snapshot
+
+    def invalidate(self, user_id: int) -> None:
+        self._invalidations += 1
+        self._entries.pop(user_id, None)
+
+    def invalidate_many(self, user_ids: Iterable[int]) -> None:
+        self._invalidations += 1
+        for user_id in user_ids:
+            self._entries.pop(user_id, None)
+
+    def clear(self) -> None:
+        self._invalidations += 1
+        self._entries.clear()
+
+    def start(self, engine: AsyncEngine) -> None:
+        """
+        Starts listening for invalidations from other replicas. Keeps one
+        pooled connection checked out for as long as it runs.
+        """
+        self._listen_task = asyncio.create_task(self._listen(engine), name="subscription-cache-listen")
+
+    async def stop(self) -> None:
+        if self._listen_task is not None:
+            self._listen_task.cancel()
+            await asyncio.gather(self._listen_task, return_exceptions=True)
+            self._listen_task = None
+
+    def _on_notification(self, connection, pid: int, channel: str, payload: str) -> None:
+        self.invalidate(int(payload))
+
+    async def _listen(self, engine: AsyncEngine) -> None:
+        while True:
+            try:
+                async with engine.connect() as connection:
+                    driver_connection = (await connection.get_raw_connection()).driver_connection
+                    lost = asyncio.Event()
+                    driver_connection.add_termination_listener(lambda _: lost.set())
+                    await driver_connection.add_listener(INVALIDATION_CHANNEL, self._on_notification)
+                    try:
+                        self.clear()
+                        logging.info(f"Subscription cache listening on '{INVALIDATION_CHANNEL}'.")
+                        await lost.wait()
+                        await connection.invalidate()
+                    finally:
+                        if not lost.is_set():
+                            # Don't hand a LISTENing connection back to the pool
+                            await driver_connection.remove_listener(INVALIDATION_CHANNEL, self._on_notification)
+            except Exception as e:
+                logging.error(f"Subscription cache invalidation listener failed: {e}")
+            else:
+                logging.warning("Subscription cache lost its invalidation listener connection.")
+            # Until we listen again, other replicas' changes are only caught by the TTL
+            self.clear()
+            await asyncio.sleep(LISTEN_RETRY_DELAY)
+
+
+subscription_cache = SubscriptionCache()
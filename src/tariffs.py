@@ -0,0 +1,108 @@
+import asyncio
+import logging
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Dict
+
+from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+from sqlalchemy import select, func, literal, literal_column
+from sqlalchemy.dialects.postgresql import aggregate_order_by
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from src.config import TARIFF_REFRESH_INTERVAL
+from src.lexicon import Texts
+from src.models import Tariff
+
+
+@dataclass(frozen=True)
+class TariffOption:
+    amount: int
+    duration: timedelta
+    title: str
+
+
+class TariffCatalog:
+    """
+    In-memory copy of the active tariffs and the keyboard that offers them.
+
+    A background task compares a hash of the whole tariffs table every
+    TARIFF_REFRESH_INTERVAL seconds and reloads it only when something
+    changed, so prices can be edited in the database without a redeploy.
+    The tariffs keyboard is built once per version and locale; menu presses
+    hand out the same markup object.
+    """
+
+    def __init__(self, refresh_interval: float = TARIFF_REFRESH_INTERVAL):
+        self.refresh_interval = refresh_interval
+        self.version: str | None = None
+        self._tariffs: Dict[int, TariffOption] = {}
+        self._keyboards: Dict[str, InlineKeyboardMarkup] = {}
+        self._refresh_task: asyncio.Task | None = None
+
+    async def warm(self, async_session: async_sessionmaker) -> None:
+        try:
+            await self.refresh(async_session)
+        except Exception as e:
+            # Keep serving the previous tariffs
+            logging.warning(f"Could not refresh the tariff catalog: {e}")
+
+    def start(self, async_session: async_sessionmaker) -> None:
+        self._refresh_task = asyncio.create_task(self._refresh_loop(async_session), name="tariff-catalog-refresh")
+
+    async def stop(self) -> None:
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+            await asyncio.gather(self._refresh_task, return_exceptions=True)
+            self._refresh_task = None
+
+    def get(self, amount: int) -> TariffOption | None:
+        return self._tariffs.get(amount)
+
+    def keyboard(self, texts: Texts) -> InlineKeyboardMarkup:
+        keyboard = self._keyboards.get(texts.locale)
+        if keyboard is None:
+            keyboard = InlineKeyboardMarkup(
+                inline_keyboard=[
+                    [InlineKeyboardButton(text=tariff.title, callback_data=f"tariff_{tariff.amount}")]
+                    for tariff in self._tariffs.values()
+                ] + [
+                    [InlineKeyboardButton(text=texts('buttons.tariffs_menu.custom_amount'), callback_data="tariff_custom")],
+                ]
+            )
+            self._keyboards[texts.locale] = keyboard
+        return keyboard
+
+    async def refresh(self, async_session: async_sessionmaker) -> bool:
+        """
+        Reloads the tariffs if the table changed. Returns True if it did.
+        """
+        async with async_session() as session:
+            # The table is tiny, so hashing every row is cheaper than tracking changes
+            version = (await session.execute(
+                select(func.md5(func.coalesce(
+                    func.string_agg(literal_column("tariffs::text"), aggregate_order_by(literal(","), Tariff.id)), "",
+                )))
+                .select_from(Tariff)
+            )).scalar_one()
+            if version == self.version:
+                return False
+            rows = (await session.execute(
+                select(Tariff.amount, Tariff.duration_days, Tariff.title)
+                .where(Tariff.is_active)
+                .order_by(Tariff.amount)
+            )).all()
+
+        # Swap whole objects, so a menu press never sees a half-updated catalog
+        self._tariffs = {row.amount: TariffOption(row.amount, timedelta(days=row.duration_days), row.title) for row in rows}
+        self._keyboards = {}
+        self.version = version
+        logging.info(f"Tariff catalog loaded: {len(self._tariffs)} tariffs (version {version[:8]})")
+        return True
+
+    async def _refresh_loop(self, async_session: async_sessionmaker) -> None:
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            await self.warm(async_session)
+
+
+tariff_catalog = TariffCatalog()
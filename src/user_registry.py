@@ -0,0 +1,57 @@
+from collections import OrderedDict
+
+from aiogram.types import User as TelegramUser
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from src.config import USER_CACHE_SIZE
+from src.metrics import CACHE_LOOKUPS, CACHE_ENTRIES, USERS_REGISTERED
+from src.models import User
+
+
+class UserRegistry:
+    """
+    Registers Telegram users on first contact.
+
+    Already registered telegram_ids are kept in a bounded LRU, so repeated
+    /start and /help presses never touch the database. First-time users are
+    stored with a single INSERT ... ON CONFLICT DO NOTHING RETURNING, which
+    also makes concurrent /start calls for the same user safe.
+    """
+
+    def __init__(self, max_size: int = USER_CACHE_SIZE):
+        self.max_size = max_size
+        self._known: OrderedDict[int, None] = OrderedDict()
+        self._hits = CACHE_LOOKUPS.labels("users", "hit")
+        self._misses = CACHE_LOOKUPS.labels("users", "miss")
+        CACHE_ENTRIES.labels("users").set_function(lambda: len(self._known))
+
+    async def ensure_registered(self, async_session: async_sessionmaker, user: TelegramUser) -> bool:
+        """
+        Returns True if the user has just been registered.
+        """
+        if user.id in self._known:
+            self._known.move_to_end(user.id)
+            self._hits.inc()
+            return False
+
+        self._misses.inc()
+        async with async_session() as session:
+            result = await session.execute(
+                insert(User)
+                .values(telegram_id=user.id, full_name=user.full_name, username=user.username)
+                .on_conflict_do_nothing(index_elements=[User.telegram_id])
+                .returning(User.id)
+            )
+            created = result.scalar_one_or_none() is not None
+            await session.commit()
+
+        self._known[user.id] = None
+        if len(self._known) > self.max_size:
+            self._known.popitem(last=False)
+        if created:
+            USERS_REGISTERED.inc()
+        return created
+
+
+user_registry = UserRegistry()
@@ -0,0 +1,196 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict
+
+from sqlalchemy import select, update, func
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from src.config import WEBHOOK_WORKERS, WEBHOOK_MAX_ATTEMPTS, WEBHOOK_POLL_INTERVAL
+from src.metrics import WEBHOOK_QUEUE_DEPTH
+from src.models import WebhookEvent, WebhookEventStatus
+
+# How long a claimed event stays invisible to other workers.
+# If a worker dies mid-processing, the event becomes claimable again after this.
+LEASE_DURATION = timedelta(seconds=60)
+RETRY_BASE_DELAY = 5
+RETRY_MAX_DELAY = 600
+# How often the pending events are counted for the webhook_inbox_pending_events gauge
+DEPTH_REFRESH_INTERVAL = 15
+
+EventHandler = Callable[[str, Dict[str, Any]], Awaitable[None]]
+
+
+class WebhookInbox:
+    """
+    Fast-ack inbox for YooKassa notifications.
+
+    The webhook handler persists the raw event and returns immediately.
+    A pool of workers claims events with SELECT ... FOR UPDATE SKIP LOCKED,
+    runs the handler, and retries failures with exponential backoff until
+    the event is moved to the dead-letter state.
+    """
+
+    def __init__(
+        self,
+        async_session: async_sessionmaker,
+        handler: EventHandler,
+        workers: int = WEBHOOK_WORKERS,
+        max_attempts: int = WEBHOOK_MAX_ATTEMPTS,
+        poll_interval: float = WEBHOOK_POLL_INTERVAL,
+    ):
+        self.async_session = async_session
+        self.handler = handler
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.poll_interval = poll_interval
+        self._wakeup = asyncio.Event()
+        self._tasks: list[asyncio.Task] = []
+        self._depth_task: asyncio.Task | None = None
+        self._stopping = False
+
+    async def enqueue(self, event_type: str, object_id: str, payload: Dict[str, Any]) -> None:
+        """
+        Stores an event. Redeliveries of an already stored event are ignored.
+        """
+        now = datetime.now()
+        async with self.async_session() as session:
+            await session.execute(
+                insert(WebhookEvent)
+                .values(
+                    event=event_type,
+                    object_id=object_id,
+                    payload=payload,
+                    status=WebhookEventStatus.pending,
+                    attempts=0,
+                    next_attempt_at=now,
+                    created_at=now,
+                )
+                .on_conflict_do_nothing(constraint='uq_webhook_events_event_object_id')
+            )
+            await session.commit()
+        self._wakeup.set()
+
+    async def pending_count(self) -> int:
+        async with self.async_session() as session:
+            return (await session.execute(
+                select(func.count()).select_from(WebhookEvent).where(WebhookEvent.status == WebhookEventStatus.pending)
+            )).scalar_one()
+
+    def start(self) -> None:
+        self._stopping = False
+        for n in range(self.workers):
+            self._tasks.append(asyncio.create_task(self._worker(n), name=f"webhook-inbox-{n}"))
+        self._depth_task = asyncio.create_task(self._depth_loop(), name="webhook-inbox-depth")
+        logging.info(f"Webhook inbox started with {self.workers} workers.")
+
+    async def stop(self, timeout: float = 0) -> None:
+        """
+        Lets workers finish the event they hold for up to `timeout` seconds,
+        then cancels them. A cancelled event is retried once its lease expires.
+        """
+        self._stopping = True
+        self._wakeup.set()
+        if self._depth_task is not None:
+            self._depth_task.cancel()
+            await asyncio.gather(self._depth_task, return_exceptions=True)
+            self._depth_task = None
+        if self._tasks and timeout > 0:
+            await asyncio.wait(self._tasks, timeout=timeout)
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+
+    async def _depth_loop(self) -> None:
+        # Counted here rather than per scrape, so /metrics never queries the database
+        while True:
+            try:
+                WEBHOOK_QUEUE_DEPTH.set(await self.pending_count())
+            except Exception as e:
+                logging.warning(f"Could not count pending webhook events: {e}")
+            await asyncio.sleep(DEPTH_REFRESH_INTERVAL)
+
+    async def _worker(self, n: int) -> None:
+        while not self._stopping:
+            try:
+                event = await self._claim()
+            except Exception as e:
+                logging.error(f"Webhook inbox worker {n} could not claim an event: {e}")
+                event = None
+
+            if event is None:
+                if self._stopping:
+                    break
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            try:
+                await self._process(event)
+            except Exception as e:
+                # The lease expires and the event is picked up again
+                logging.error(f"Webhook inbox worker {n} could not record the result of event {event.id}: {e}")
+
+    async def _process(self, event: WebhookEvent) -> None:
+        try:
+            await self.handler(event.event, event.payload)
+        except Exception as e:
+            logging.error(f"Webhook event {event.id} ({event.event} {event.object_id}) failed on attempt {event.attempts}: {e}")
+            await self._fail(event, e)
+        else:
+            await self._set_status(event.id, WebhookEventStatus.done)
+
+    async def _claim(self) -> WebhookEvent | None:
+        """
+        Claims the oldest due event by pushing its next_attempt_at past the lease.
+        """
+        now = datetime.now()
+        async with self.async_session() as session:
+            due_event = (
+                select(WebhookEvent.id)
+                .where(
+                    WebhookEvent.status == WebhookEventStatus.pending,
+                    WebhookEvent.next_attempt_at <= now,
+                )
+                .order_by(WebhookEvent.next_attempt_at)
+                .limit(1)
+                .with_for_update(skip_locked=True)
+                .scalar_subquery()
+            )
+            result = await session.execute(
+                update(WebhookEvent)
+                .where(WebhookEvent.id == due_event)
+                .values(attempts=WebhookEvent.attempts + 1, next_attempt_at=now + LEASE_DURATION)
+                .returning(WebhookEvent)
+            )
+            event = result.scalar_one_or_none()
+            await session.commit()
+            return event
+
+    async def _fail(self, event: WebhookEvent, error: Exception) -> None:
+        if event.attempts >= self.max_attempts:
+            logging.error(f"Webhook event {event.id} moved to dead-letter after {event.attempts} attempts.")
+            await self._set_status(event.id, WebhookEventStatus.dead, error)
+            return
+
+        delay = min(RETRY_BASE_DELAY * 2 ** (event.attempts - 1), RETRY_MAX_DELAY)
+        async with self.async_session() as session:
+            await session.execute(
+                update(WebhookEvent)
+                .where(WebhookEvent.id == event.id)
+                .values(next_attempt_at=datetime.now() + timedelta(seconds=delay), last_error=str(error))
+            )
+            await session.commit()
+
+    async def _set_status(self, event_id: int, status: WebhookEventStatus, error: Exception | None = None) -> None:
+        values = {"status": status}
+        if error is not None:
+            values["last_error"] = str(error)
+        async with self.async_session() as session:
+            await session.execute(update(WebhookEvent).where(WebhookEvent.id == event_id).values(**values))
+            await session.commit()
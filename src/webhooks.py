@@ -1,22 +1,31 @@
+import asyncio
 import logging
 from aiohttp import web
 from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, delete
-from datetime import datetime, timedelta
-from yookassa import Payment as YooKassaPayment
+from sqlalchemy import select, update
 
-from src.models import Payment, PaymentStatus, Subscription, SubscriptionStatus
+from src.models import Subscription
 from src.config import GROUP_ID
 from src.lexicon import lexicon
+from src.yookassa_client import YooKassaClient
+from src.webhook_inbox import WebhookInbox
+from src.activation import activate_payment
+from src.invite_links import InviteLinkPool
+from src.outbox import OutboxDispatcher
+from src.bot_metadata import bot_metadata
+from src.metrics import metrics_handler
+from src.health import healthz_handler, readyz_handler
 
 async def yookassa_webhook_handler(request: web.Request) -> web.Response:
     """
     This handler receives webhooks from YooKassa.
+    It only persists the event to the inbox and acknowledges it right away;
+    the actual processing happens in WebhookInbox workers.
     """
-    bot: Bot = request.app["bot"]
-    async_session: AsyncSession = request.app["async_session"]
+    inbox: WebhookInbox = request.app["webhook_inbox"]
 
     try:
         event_json = await request.json()
@@ -27,134 +36,118 @@ async def yookassa_webhook_handler(request: web.Request) -> web.Response:
     event_type = event_json.get("event")
     payment_object = event_json.get("object")
 
+    if not event_type or not isinstance(payment_object, dict) or not payment_object.get("id"):
+        logging.warning(f"Malformed webhook payload: {event_json}")
+        return web.Response(status=400, text="Malformed event")
+
+    try:
+        await inbox.enqueue(event_type, payment_object["id"], event_json)
+    except Exception as e:
+        # Let YooKassa redeliver the notification later
+        logging.error(f"Could not store webhook event {event_type} for {payment_object['id']}: {e}")
+        return web.Response(status=500, text="Could not store event")
+
+    return web.Response(status=200)
+
+async def process_yookassa_event(event_type: str, event_json: dict, async_session: AsyncSession, yookassa: YooKassaClient, outbox: OutboxDispatcher) -> None:
+    """
+    Processes a stored YooKassa event. Raising makes the inbox retry it later.
+    Telegram side effects are queued in the outbox by the activation itself.
+    """
+    payment_object = event_json.get("object")
+
     if event_type == "payment.succeeded" and payment_object:
         yookassa_payment_id = payment_object.get("id")
-        logging.info(f"Received successful payment webhook for yookassa_id: {yookassa_payment_id}")
+        logging.info(f"Processing successful payment webhook for yookassa_id: {yookassa_payment_id}")
         
         # --- Webhook Validation: Object Status Check ---
+        payment_info = await yookassa.find_payment(yookassa_payment_id)
+        if payment_info.get("status") != 'succeeded':
+            logging.warning(f"Invalid payment status for yookassa_id: {yookassa_payment_id}. Status: {payment_info.get('status')}")
+            return
+
+        activation = await activate_payment(async_session, yookassa_payment_id)
+        if activation is None:
+            logging.warning(f"Payment record not found for yookassa_id: {yookassa_payment_id}")
+            return
+        if not activation.activated:
+            logging.info(f"Payment {activation.payment_id} was already processed, skipping duplicate notification.")
+            return
+        outbox.wakeup()
+
+async def send_subscription_access(user_id: int, payload: dict, bot: Bot, async_session: AsyncSession, invite_links: InviteLinkPool) -> None:
+    """
+    Outbox handler for SUBSCRIPTION_ACTIVATED: sends the user an invite link
+    to the group. Safe to retry; the claimed link is stored on the
+    subscription and reused.
+    """
+    subscription_id = payload["subscription_id"]
+    bot_message_id = payload.get("bot_message_id")
+
+    async def stored_invite_link() -> str | None:
+        async with async_session() as session:
+            return (await session.execute(
+                select(Subscription.invite_link).where(Subscription.id == subscription_id)
+            )).scalar_one_or_none()
+
+    async def subscription_invite_link() -> str:
+        invite_link = await stored_invite_link()
+        if invite_link is not None:
+            return invite_link
+        # No session is open while the link is claimed or created through Telegram
+        invite_link = await invite_links.issue(user_id)
+        async with async_session() as session:
+            stored = (await session.execute(
+                update(Subscription)
+                .where(Subscription.id == subscription_id, Subscription.invite_link.is_(None))
+                .values(invite_link=invite_link)
+                .returning(Subscription.invite_link)
+            )).scalar_one_or_none()
+            await session.commit()
+        if stored is None:
+            # An earlier attempt stored a link in the meantime; keep sending that one
+            return await stored_invite_link()
+        return stored
+
+    async def unban() -> None:
         try:
-            payment_info = YooKassaPayment.find_one(yookassa_payment_id)
-            if not payment_info or payment_info.status != 'succeeded':
-                logging.warning(f"Invalid payment status for yookassa_id: {yookassa_payment_id}. Status: {payment_info.status if payment_info else 'Not Found'}")
-                return web.Response(status=400, text="Invalid payment status")
+            await bot.unban_chat_member(chat_id=int(GROUP_ID), user_id=user_id, only_if_banned=True)
         except Exception as e:
-            logging.error(f"Error validating payment with YooKassa API: {e}")
-            return web.Response(status=500, text="Error validating payment")
+            logging.info(f"Could not unban user {user_id} (they were likely not banned): {e}")
 
-        async with async_session() as session:
-            payment = await session.execute(
-                select(Payment).filter_by(yookassa_id=yookassa_payment_id)
-            )
-            payment = payment.scalar_one_or_none()
-
-            if payment:
-                logging.info(f"Found payment record with ID: {payment.id} and subscription_id: {payment.subscription_id}")
-                if payment.status != PaymentStatus.succeeded: # Process only once
-                    payment.status = PaymentStatus.succeeded
-                    
-                    subscription = await session.get(Subscription, payment.subscription_id)
-                    if subscription:
-                        # --- Step 3.1: Find and Expire Old Active Subscriptions ---
-                        other_active_subscriptions_result = await session.execute(
-                            select(Subscription).where(
-                                Subscription.user_id == subscription.user_id,
-                                Subscription.status == SubscriptionStatus.active,
-                                Subscription.id != subscription.id
-                            )
-                        )
-                        for old_active_sub in other_active_subscriptions_result.scalars().all():
-                            old_active_sub.status = SubscriptionStatus.expired
-                            logging.info(f"Expired old active subscription {old_active_sub.id} for user {subscription.user_id}")
-
-                        # --- Step 3.2: Activate the New Subscription (Overwrite logic) ---
-                        subscription.status = SubscriptionStatus.active
-                        subscription.start_date = datetime.now()
-                        subscription.end_date = datetime.now() + timedelta(days=30)
-                        
-                        # --- Step 3.3: Cleanup Pending Subscriptions and Payments ---
-                        pending_subs_to_delete = await session.execute(
-                            select(Subscription).where(
-                                Subscription.user_id == subscription.user_id,
-                                Subscription.status == SubscriptionStatus.pending,
-                                Subscription.id != subscription.id
-                            )
-                        )
-                        for sub_to_delete in pending_subs_to_delete.scalars().all():
-                            # First, delete the associated payment
-                            await session.execute(
-                                delete(Payment).where(Payment.subscription_id == sub_to_delete.id)
-                            )
-                            # Then, delete the subscription
-                            await session.delete(sub_to_delete)
-                        
-                        logging.info(f"Cleaned up pending subscriptions and payments for user {subscription.user_id}")
-
-                        await session.commit() # Commit all changes
-
-                        # --- Send confirmation message ---
-                        try:
-                            chat_member = await bot.get_chat_member(chat_id=int(GROUP_ID), user_id=subscription.user_id)
-                            is_member = chat_member.status in ["member", "administrator", "creator"]
-                        except Exception:
-                            is_member = False
-
-                        if is_member:
-                            group_chat = await bot.get_chat(int(GROUP_ID))
-                            invite_link = await bot.create_chat_invite_link(
-                                chat_id=int(GROUP_ID),
-                                member_limit=1,
-                                expire_date=datetime.now() + timedelta(days=3)
-                            )
-                            
-                            keyboard = InlineKeyboardMarkup(inline_keyboard=[
-                                [InlineKeyboardButton(text=f"Перейти в \"{group_chat.title}\"", url=invite_link.invite_link)]
-                            ])
-                            
-                            if payment.bot_message_id:
-                                await bot.edit_message_text(
-                                    chat_id=subscription.user_id,
-                                    message_id=payment.bot_message_id,
-                                    text=lexicon['subscription']['renewed_successfully'],
-                                    reply_markup=keyboard
-                                )
-                            else:
-                                await bot.send_message(
-                                    chat_id=subscription.user_id,
-                                    text=lexicon['subscription']['renewed_successfully'],
-                                    reply_markup=keyboard
-                                )
-                        else:
-                            try:
-                                await bot.unban_chat_member(chat_id=int(GROUP_ID), user_id=subscription.user_id)
-                            except Exception as e:
-                                logging.info(f"Could not unban user {subscription.user_id} (they were likely not banned): {e}")
-
-                            invite_link = await bot.create_chat_invite_link(
-                                chat_id=int(GROUP_ID),
-                                member_limit=1,
-                                expire_date=datetime.now() + timedelta(days=3)
-                            )
-                            
-                            subscription.invite_link = invite_link.invite_link
-                            await session.commit()
-
-                            if payment.bot_message_id:
-                                await bot.edit_message_text(
-                                    chat_id=subscription.user_id,
-                                    message_id=payment.bot_message_id,
-                                    text=lexicon['subscription']['payment_processed_invite_link'].format(invite_link=invite_link.invite_link)
-                                )
-                            else:
-                                await bot.send_message(
-                                    chat_id=subscription.user_id,
-                                    text=lexicon['subscription']['payment_processed_invite_link'].format(invite_link=invite_link.invite_link)
-                                )
-                else:
-                    logging.error(f"Subscription with ID {payment.subscription_id} not found for payment {payment.id}")
-            else:
-                logging.warning(f"Payment record not found for yookassa_id: {yookassa_payment_id}")
-    
-    return web.Response(status=200)
+    # Outbox messages have no incoming update to take the language from
+    texts = lexicon.texts()
+
+    try:
+        chat_member = await bot.get_chat_member(chat_id=int(GROUP_ID), user_id=user_id)
+        is_member = chat_member.status in ["member", "administrator", "creator"]
+    except Exception:
+        is_member = False
+
+    if is_member:
+        invite_link, group_title = await asyncio.gather(subscription_invite_link(), bot_metadata.get_group_title(bot))
+        text = texts('subscription.renewed_successfully')
+        keyboard = InlineKeyboardMarkup(inline_keyboard=[
+            [InlineKeyboardButton(text=texts('buttons.go_to_group', group_title=group_title), url=invite_link)]
+        ])
+    else:
+        _, invite_link = await asyncio.gather(unban(), subscription_invite_link())
+        text = texts('subscription.payment_processed_invite_link', invite_link=invite_link)
+        keyboard = None
+
+    if bot_message_id:
+        try:
+            await bot.edit_message_text(chat_id=user_id, message_id=bot_message_id, text=text, reply_markup=keyboard)
+            return
+        except TelegramBadRequest as e:
+            if "message is not modified" in str(e):
+                # Already edited by an earlier attempt
+                return
+            logging.info(f"Could not edit payment message {bot_message_id} for user {user_id}, sending a new one: {e}")
+    await bot.send_message(chat_id=user_id, text=text, reply_markup=keyboard)
 
 def setup_webhook_routes(app: web.Application):
-    app.router.add_post("/yookassa_webhook", yookassa_webhook_handler)
\ No newline at end of file
+    app.router.add_post("/yookassa_webhook", yookassa_webhook_handler)
+    app.router.add_get("/metrics", metrics_handler)
+    app.router.add_get("/healthz", healthz_handler)
+    app.router.add_get("/readyz", readyz_handler)
\ No newline at end of file
@@ -0,0 +1,186 @@
+import asyncio
+import logging
+import random
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Dict
+
+import aiohttp
+
+from src.config import (
+    YOOKASSA_API_URL,
+    YOOKASSA_TIMEOUT,
+    YOOKASSA_CONNECT_TIMEOUT,
+    YOOKASSA_MAX_RETRIES,
+    YOOKASSA_POOL_SIZE,
+)
+from src.metrics import YOOKASSA_REQUEST_DURATION
+
+# Statuses after which a request is safe and useful to repeat.
+# POST requests always carry an Idempotence-Key, so YooKassa will not
+# create a second payment when we retry them.
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+
+def _api_timestamp(value: datetime) -> str:
+    # Naive datetimes are local time, as everywhere else in the bot
+    return value.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + "Z"
+
+
+class YooKassaError(Exception):
+    """
+    Raised when YooKassa rejects a request or keeps failing after all retries.
+    """
+
+    def __init__(self, status: int | None, code: str | None = None, description: str | None = None):
+        self.status = status
+        self.code = code
+        self.description = description
+        super().__init__(f"YooKassa API error (status={status}, code={code}): {description}")
+
+
+class YooKassaClient:
+    """
+    Non-blocking YooKassa API client built on a pooled keep-alive aiohttp session.
+    Replaces the synchronous SDK calls that used to block the event loop.
+    """
+
+    def __init__(
+        self,
+        shop_id: str | None,
+        secret_key: str | None,
+        base_url: str = YOOKASSA_API_URL,
+        timeout: float = YOOKASSA_TIMEOUT,
+        connect_timeout: float = YOOKASSA_CONNECT_TIMEOUT,
+        max_retries: int = YOOKASSA_MAX_RETRIES,
+        pool_size: int = YOOKASSA_POOL_SIZE,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.max_retries = max_retries
+        self._auth = aiohttp.BasicAuth(shop_id or "", secret_key or "")
+        self._timeout = aiohttp.ClientTimeout(total=timeout, connect=connect_timeout)
+        self._pool_size = pool_size
+        self._session: aiohttp.ClientSession | None = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        # The session must be created inside a running event loop, so it is built lazily.
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self._pool_size, keepalive_timeout=60)
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                auth=self._auth,
+                timeout=self._timeout,
+                raise_for_status=False,
+            )
+        return self._session
+
+    async def close(self) -> None:
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    async def create_payment(self, payload: Dict[str, Any], idempotence_key: str | None = None) -> Dict[str, Any]:
+        """
+        Creates a payment. The same idempotence key is reused on every retry.
+        """
+        return await self._request(
+            "POST",
+            "/payments",
+            json=payload,
+            idempotence_key=idempotence_key or str(uuid.uuid4()),
+        )
+
+    async def find_payment(self, payment_id: str) -> Dict[str, Any]:
+        """
+        Returns the payment object as reported by YooKassa.
+        """
+        return await self._request("GET", f"/payments/{payment_id}", endpoint="/payments/{id}")
+
+    async def list_payments(
+        self,
+        status: str | None = None,
+        created_after: datetime | None = None,
+        captured_after: datetime | None = None,
+        limit: int = 100,
+        cursor: str | None = None,
+    ) -> Dict[str, Any]:
+        """
+        Returns one page of the payments list, newest first. Pass the page's
+        next_cursor to get the following one.
+        """
+        params: Dict[str, Any] = {"limit": limit}
+        if status is not None:
+            params["status"] = status
+        if created_after is not None:
+            params["created_at.gte"] = _api_timestamp(created_after)
+        if captured_after is not None:
+            params["captured_at.gte"] = _api_timestamp(captured_after)
+        if cursor is not None:
+            params["cursor"] = cursor
+        return await self._request("GET", "/payments", params=params)
+
+    async def iter_payments(self, **filters) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Yields every payment matching the list_payments() filters, page by page.
+        """
+        cursor = None
+        while True:
+            page = await self.list_payments(cursor=cursor, **filters)
+            for payment in page.get("items", []):
+                yield payment
+            cursor = page.get("next_cursor")
+            if not cursor:
+                return
+
+    async def _request(
+        self,
+        method: str,
+        path: str,
+        json: Dict[str, Any] | None = None,
+        params: Dict[str, Any] | None = None,
+        idempotence_key: str | None = None,
+        endpoint: str | None = None,
+    ) -> Dict[str, Any]:
+        """
+        `endpoint` is the path with ids replaced by placeholders, used as a metrics label.
+        """
+        headers = {"Idempotence-Key": idempotence_key} if idempotence_key else None
+        url = f"{self.base_url}{path}"
+        last_error: YooKassaError | None = None
+
+        for attempt in range(self.max_retries + 1):
+            delay = None
+            started = time.perf_counter()
+            status = "error"
+            try:
+                async with self._get_session().request(method, url, json=json, params=params, headers=headers) as response:
+                    status = str(response.status)
+                    try:
+                        body = await response.json(content_type=None)
+                    except ValueError:
+                        # Proxies in front of the API may answer with HTML on 5xx
+                        body = None
+                    if response.status == 200 and body is not None:
+                        return body
+                    body = body or {}
+                    last_error = YooKassaError(response.status, body.get("code"), body.get("description"))
+                    if response.status == 202:
+                        # The idempotent request is still being processed on YooKassa's side.
+                        delay = body.get("retry_after", 1000) / 1000
+                    elif response.status not in RETRYABLE_STATUSES:
+                        raise last_error
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                status = type(e).__name__
+                last_error = YooKassaError(None, type(e).__name__, str(e))
+            finally:
+                YOOKASSA_REQUEST_DURATION.labels(method, endpoint or path, status).observe(time.perf_counter() - started)
+
+            if attempt == self.max_retries:
+                break
+            if delay is None:
+                delay = min(0.2 * 2 ** attempt, 5) + random.uniform(0, 0.1)
+            logging.warning(f"YooKassa {method} {path} failed (attempt {attempt + 1}): {last_error}. Retrying in {delay:.2f}s")
+            await asyncio.sleep(delay)
+
+        raise last_error
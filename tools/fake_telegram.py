@@ -0,0 +1,293 @@
+"""
+Local fake of the Telegram Bot API for offline runs and benchmarks.
+
+The fake records every Bot API call, answers with minimal valid objects,
+and can feed updates either through getUpdates (polling) or by POSTing
+them to a webhook endpoint.
+
+Run it on its own and point the bot at it:
+
+    python -m tools.fake_telegram serve --port 8081
+    TELEGRAM_API_URL=http://localhost:8081 python main.py
+
+Compare end-to-end update latency of both delivery modes. Each update is a
+message that a trivial handler answers, and latency is measured from
+injecting the update to the fake receiving the sendMessage call:
+
+    python -m tools.fake_telegram bench --mode polling --updates 2000
+    python -m tools.fake_telegram bench --mode webhook --updates 2000
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import statistics
+import time
+from collections import defaultdict
+from typing import Any
+
+import aiohttp
+from aiohttp import web
+
+BOT_ID = 123456
+BOT_USERNAME = "fake_bot"
+BOT_USER = {"id": BOT_ID, "is_bot": True, "first_name": "Fake", "username": BOT_USERNAME}
+
+
+class FakeTelegramServer:
+    """
+    Records Bot API calls and serves updates for long polling.
+    """
+
+    def __init__(self, latency_ms: float = 0, group_title: str = "Fake group"):
+        self.latency = latency_ms / 1000
+        self.group_title = group_title
+        self.calls: list[tuple[float, str, dict]] = []
+        self.call_counts: dict[str, int] = defaultdict(int)
+        self._updates: asyncio.Queue[dict] = asyncio.Queue()
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1)
+        self._waiters: dict[tuple[str, Any], asyncio.Future] = {}
+
+    # --- Update injection ---
+
+    def make_message_update(self, user_id: int, text: str, chat_type: str = "private") -> dict:
+        return {
+            "update_id": next(self._update_ids),
+            "message": {
+                "message_id": next(self._message_ids),
+                "date": int(time.time()),
+                "chat": {"id": user_id, "type": chat_type},
+                "from": {"id": user_id, "is_bot": False, "first_name": f"User {user_id}", "language_code": "ru"},
+                "text": text,
+                **({"entities": [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]} if text.startswith("/") else {}),
+            },
+        }
+
+    def make_callback_update(self, user_id: int, data: str, message_id: int = 1) -> dict:
+        return {
+            "update_id": next(self._update_ids),
+            "callback_query": {
+                "id": str(next(self._message_ids)),
+                "from": {"id": user_id, "is_bot": False, "first_name": f"User {user_id}", "language_code": "ru"},
+                "chat_instance": str(user_id),
+                "data": data,
+                "message": {
+                    "message_id": message_id,
+                    "date": int(time.time()),
+                    "chat": {"id": user_id, "type": "private"},
+                    "from": BOT_USER,
+                    "text": "menu",
+                },
+            },
+        }
+
+    def push_update(self, update: dict) -> None:
+        self._updates.put_nowait(update)
+
+    def wait_for_call(self, method: str, chat_id: Any) -> asyncio.Future:
+        """
+        Resolves with the loop time of the next `method` call for `chat_id`.
+        """
+        future = asyncio.get_running_loop().create_future()
+        self._waiters[(method, str(chat_id))] = future
+        return future
+
+    # --- Bot API ---
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        params = await self._read_params(request)
+        received_at = asyncio.get_running_loop().time()
+        self.calls.append((received_at, method, params))
+        self.call_counts[method] += 1
+
+        waiter = self._waiters.pop((method, str(params.get("chat_id"))), None)
+        if waiter is not None and not waiter.done():
+            waiter.set_result(received_at)
+
+        if method == "getUpdates":
+            return web.json_response({"ok": True, "result": await self._get_updates(params)})
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return web.json_response({"ok": True, "result": self.respond(method, params)})
+
+    @staticmethod
+    async def _read_params(request: web.Request) -> dict:
+        if request.content_type == "application/json":
+            return await request.json()
+        params = {}
+        for key, value in (await request.post()).items():
+            if isinstance(value, str):
+                try:
+                    value = json.loads(value)
+                except ValueError:
+                    pass
+            params[key] = value
+        return params
+
+    async def _get_updates(self, params: dict) -> list[dict]:
+        timeout = float(params.get("timeout") or 0)
+        updates = []
+        try:
+            updates.append(await asyncio.wait_for(self._updates.get(), timeout=timeout) if timeout else self._updates.get_nowait())
+        except (asyncio.TimeoutError, asyncio.QueueEmpty):
+            return []
+        while not self._updates.empty() and len(updates) < int(params.get("limit") or 100):
+            updates.append(self._updates.get_nowait())
+        return updates
+
+    def _message(self, params: dict) -> dict:
+        return {
+            "message_id": int(params.get("message_id") or next(self._message_ids)),
+            "date": int(time.time()),
+            "chat": {"id": int(params["chat_id"]), "type": "private"},
+            "from": BOT_USER,
+            "text": str(params.get("text", "")),
+        }
+
+    def respond(self, method: str, params: dict) -> Any:
+        if method == "getMe":
+            return BOT_USER
+        if method in ("sendMessage", "editMessageText"):
+            return self._message(params)
+        if method == "getChat":
+            return {
+                "id": int(params["chat_id"]),
+                "type": "supergroup",
+                "title": self.group_title,
+                "accent_color_id": 0,
+                "max_reaction_count": 11,
+                "accepted_gift_types": {
+                    "unlimited_gifts": False,
+                    "limited_gifts": False,
+                    "unique_gifts": False,
+                    "premium_subscription": False,
+                },
+            }
+        if method == "getChatMember":
+            return {"status": "left", "user": {"id": int(params["user_id"]), "is_bot": False, "first_name": "User"}}
+        if method == "createChatInviteLink":
+            return {
+                "invite_link": f"https://t.me/+fake{next(self._message_ids)}",
+                "creator": BOT_USER,
+                "creates_join_request": False,
+                "is_primary": False,
+                "is_revoked": False,
+                "member_limit": params.get("member_limit"),
+                "expire_date": params.get("expire_date"),
+            }
+        # setWebhook, deleteWebhook, banChatMember, answerCallbackQuery, ...
+        return True
+
+    def make_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/bot{token}/{method}", self.handle)
+        return app
+
+
+async def start_server(server: FakeTelegramServer, host: str, port: int) -> web.AppRunner:
+    runner = web.AppRunner(server.make_app())
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
+
+
+def percentiles(latencies: list[float]) -> str:
+    if len(latencies) < 2:
+        return "not enough samples"
+    quantiles = statistics.quantiles(latencies, n=100)
+    return f"p50={quantiles[49] * 1000:.1f}ms p95={quantiles[94] * 1000:.1f}ms p99={quantiles[98] * 1000:.1f}ms"
+
+
+async def serve(args):
+    await start_server(FakeTelegramServer(args.latency_ms), args.host, args.port)
+    print(f"Fake Bot API listening on http://{args.host}:{args.port}")
+    await asyncio.Event().wait()
+
+
+async def bench(args):
+    from aiogram import Bot, Dispatcher, Router
+    from aiogram.client.session.aiohttp import AiohttpSession
+    from aiogram.client.telegram import TelegramAPIServer
+    from aiogram.types import Message
+    from aiogram.webhook.aiohttp_server import SimpleRequestHandler
+
+    fake = FakeTelegramServer(args.latency_ms)
+    fake_runner = await start_server(fake, args.host, args.port)
+
+    router = Router()
+
+    @router.message()
+    async def echo(message: Message):
+        await message.answer("pong")
+
+    dp = Dispatcher()
+    dp.include_router(router)
+    bot = Bot("42:fake", session=AiohttpSession(api=TelegramAPIServer.from_base(f"http://{args.host}:{args.port}")))
+
+    secret = "bench-secret"
+    bot_runner = None
+    polling_task = None
+    if args.mode == "webhook":
+        app = web.Application()
+        SimpleRequestHandler(dispatcher=dp, bot=bot, handle_in_background=True, secret_token=secret).register(app, path="/telegram_webhook")
+        bot_runner = web.AppRunner(app)
+        await bot_runner.setup()
+        await web.TCPSite(bot_runner, args.host, args.port + 1).start()
+    else:
+        polling_task = asyncio.create_task(dp.start_polling(bot, handle_signals=False, close_bot_session=False))
+
+    loop = asyncio.get_running_loop()
+    latencies: list[float] = []
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async with aiohttp.ClientSession() as http:
+        async def one_update(user_id: int):
+            async with semaphore:
+                update = fake.make_message_update(user_id, "ping")
+                answered = fake.wait_for_call("sendMessage", user_id)
+                started = loop.time()
+                if args.mode == "webhook":
+                    async with http.post(
+                        f"http://{args.host}:{args.port + 1}/telegram_webhook",
+                        json=update,
+                        headers={"X-Telegram-Bot-Api-Secret-Token": secret},
+                    ) as response:
+                        response.raise_for_status()
+                else:
+                    fake.push_update(update)
+                latencies.append(await asyncio.wait_for(answered, timeout=30) - started)
+
+        try:
+            bench_started = loop.time()
+            await asyncio.gather(*(one_update(1000 + i) for i in range(args.updates)))
+            elapsed = loop.time() - bench_started
+        finally:
+            if polling_task is not None:
+                await dp.stop_polling()
+                await polling_task
+            if bot_runner is not None:
+                await bot_runner.cleanup()
+            await bot.session.close()
+            await fake_runner.cleanup()
+
+    print(f"{args.mode}: {args.updates} updates in {elapsed:.2f}s ({args.updates / elapsed:.0f} updates/s, concurrency {args.concurrency})")
+    print(f"update -> reply latency {percentiles(latencies)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["serve", "bench"])
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=8081, help="fake Bot API port (bench webhook listens on port + 1)")
+    parser.add_argument("--latency-ms", type=float, default=0, help="artificial Bot API latency")
+    parser.add_argument("--mode", choices=["polling", "webhook"], default="webhook")
+    parser.add_argument("--updates", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    args = parser.parse_args()
+    asyncio.run(serve(args) if args.command == "serve" else bench(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+"""
+Local YooKassa API stand-in for offline development and throughput measurements.
+
+Run the stub on its own and point the bot at it:
+
+    python -m tools.yookassa_stub serve --port 8090 --latency-ms 150
+    YOOKASSA_API_URL=http://localhost:8090/v3 python main.py
+
+Or measure YooKassaClient throughput against an in-process stub:
+
+    python -m tools.yookassa_stub bench --requests 2000 --concurrency 100 --latency-ms 50
+"""
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+from datetime import datetime, timezone
+
+from aiohttp import web
+
+from src.yookassa_client import YooKassaClient
+
+
+class YooKassaStub:
+    """
+    Keeps payments in memory and answers the subset of the v3 API the bot uses.
+    """
+
+    def __init__(self, latency_ms: float = 0, status: str = "succeeded"):
+        self.latency = latency_ms / 1000
+        self.status = status
+        self.payments: dict[str, dict] = {}
+        self.idempotence_keys: dict[str, str] = {}
+        self.request_count = 0
+
+    def _settle(self, payment: dict) -> None:
+        # Pending payments settle to the configured status on their first lookup,
+        # settled ones keep their status
+        if payment["status"] == "pending":
+            payment["status"] = self.status
+            payment["paid"] = self.status == "succeeded"
+            if payment["paid"]:
+                payment["captured_at"] = datetime.now(timezone.utc).isoformat()
+
+    async def _delay(self):
+        self.request_count += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    async def create_payment(self, request: web.Request) -> web.Response:
+        await self._delay()
+        key = request.headers.get("Idempotence-Key")
+        if not key:
+            return web.json_response({"type": "error", "code": "invalid_request", "description": "Idempotence-Key is required"}, status=400)
+        if key in self.idempotence_keys:
+            return web.json_response(self.payments[self.idempotence_keys[key]])
+
+        body = await request.json()
+        payment_id = str(uuid.uuid4())
+        payment = {
+            "id": payment_id,
+            "status": "pending",
+            "paid": False,
+            "amount": body.get("amount"),
+            "description": body.get("description"),
+            "metadata": body.get("metadata", {}),
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "confirmation": {
+                "type": "redirect",
+                "confirmation_url": f"{request.url.origin()}/checkout/{payment_id}",
+                "return_url": body.get("confirmation", {}).get("return_url"),
+            },
+        }
+        self.payments[payment_id] = payment
+        self.idempotence_keys[key] = payment_id
+        return web.json_response(payment)
+
+    async def get_payment(self, request: web.Request) -> web.Response:
+        await self._delay()
+        payment = self.payments.get(request.match_info["payment_id"])
+        if payment is None:
+            return web.json_response({"type": "error", "code": "not_found", "description": "Payment not found"}, status=404)
+        self._settle(payment)
+        return web.json_response(payment)
+
+    async def list_payments(self, request: web.Request) -> web.Response:
+        await self._delay()
+        try:
+            limit = min(int(request.query.get("limit", 10)), 100)
+            offset = int(request.query.get("cursor", 0))
+            created_after = request.query.get("created_at.gte")
+            created_after = datetime.fromisoformat(created_after) if created_after else None
+            captured_after = request.query.get("captured_at.gte")
+            captured_after = datetime.fromisoformat(captured_after) if captured_after else None
+        except ValueError as e:
+            return web.json_response({"type": "error", "code": "invalid_request", "description": str(e)}, status=400)
+
+        # Listing counts as a lookup of every payment
+        for payment in self.payments.values():
+            self._settle(payment)
+        status = request.query.get("status")
+        payments = sorted(
+            (
+                payment for payment in self.payments.values()
+                if (status is None or payment["status"] == status)
+                and (created_after is None or datetime.fromisoformat(payment["created_at"]) >= created_after)
+                and (captured_after is None or ("captured_at" in payment and datetime.fromisoformat(payment["captured_at"]) >= captured_after))
+            ),
+            key=lambda payment: payment["created_at"],
+            reverse=True,
+        )
+        page = {"type": "list", "items": payments[offset:offset + limit]}
+        if offset + limit < len(payments):
+            page["next_cursor"] = str(offset + limit)
+        return web.json_response(page)
+
+    def make_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/v3/payments", self.create_payment)
+        app.router.add_get("/v3/payments", self.list_payments)
+        app.router.add_get("/v3/payments/{payment_id}", self.get_payment)
+        return app
+
+
+async def start_stub(stub: YooKassaStub, host: str, port: int) -> web.AppRunner:
+    runner = web.AppRunner(stub.make_app())
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
+
+
+async def serve(args):
+    stub = YooKassaStub(args.latency_ms, args.status)
+    await start_stub(stub, args.host, args.port)
+    print(f"YooKassa stub listening on http://{args.host}:{args.port}/v3")
+    await asyncio.Event().wait()
+
+
+async def bench(args):
+    stub = YooKassaStub(args.latency_ms, args.status)
+    runner = await start_stub(stub, args.host, args.port)
+    client = YooKassaClient("stub", "stub", base_url=f"http://{args.host}:{args.port}/v3", pool_size=args.concurrency)
+    latencies: list[float] = []
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def one_payment(i: int):
+        async with semaphore:
+            started = time.perf_counter()
+            payment = await client.create_payment({
+                "amount": {"value": "1500.0", "currency": "RUB"},
+                "confirmation": {"type": "redirect", "return_url": "https://t.me/stub_bot"},
+                "capture": True,
+                "description": f"bench {i}",
+            })
+            await client.find_payment(payment["id"])
+            latencies.append(time.perf_counter() - started)
+
+    try:
+        started = time.perf_counter()
+        await asyncio.gather(*(one_payment(i) for i in range(args.requests)))
+        elapsed = time.perf_counter() - started
+    finally:
+        await client.close()
+        await runner.cleanup()
+
+    latencies.sort()
+    quantiles = statistics.quantiles(latencies, n=100)
+    print(f"{args.requests} create+find round trips in {elapsed:.2f}s "
+          f"({stub.request_count / elapsed:.0f} API req/s, concurrency {args.concurrency})")
+    print(f"p50={quantiles[49] * 1000:.1f}ms p95={quantiles[94] * 1000:.1f}ms p99={quantiles[98] * 1000:.1f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["serve", "bench"])
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--status", default="succeeded", help="status payments report on lookup")
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    args = parser.parse_args()
+    asyncio.run(serve(args) if args.command == "serve" else bench(args))
+
+
+if __name__ == "__main__":
+    main()